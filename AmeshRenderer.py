@@ -0,0 +1,99 @@
+"""
+AmeshRenderer: 東京アメッシュの雨雲レーダーをブラウザを使わずに 800×480 で合成する。
+
+  - 地図 (map000.jpg) と境界線 (msk000.png) は初回に 800×480 のレイヤーにしてディスクに保存する
+  - 更新ごとに取得するのは 5 分ごとのレーダー画像 (mesh/000/YYYYMMDDHHMM.gif) 1 枚だけ
+  - 重ね順は 地図 → レーダー → 境界線
+"""
+
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import requests
+from PIL import Image, ImageDraw, ImageFont
+
+
+AMESH_BASE = "https://tokyo-ame.jwa.or.jp"
+MAP_URL    = f"{AMESH_BASE}/map/map000.jpg"
+MASK_URL   = f"{AMESH_BASE}/map/msk000.png"
+MESH_URL   = f"{AMESH_BASE}/mesh/000/{{slot}}.gif"
+
+CACHE_DIR  = "./cache/amesh"
+PANEL      = (800, 480)
+SLOT_MINUTES = 5
+MAX_SLOTS_BACK = 3    # 最新の時刻の画像がまだ公開されていなければ、この回数まで前の時刻を試す
+MARGIN_COLOR = (255, 255, 255)
+
+JST = timezone(timedelta(hours=9))
+
+
+class AmeshRenderer:
+
+    source = AMESH_BASE
+
+    def __init__(self, font_path=None):
+        self.font_path = font_path
+        self.session = requests.Session()
+        self._base = None   # 地図レイヤー (RGBA, PANEL)
+        self._mask = None   # 境界線レイヤー (RGBA, PANEL)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+    def _fetch_image(self, url):
+        resp = self.session.get(url, timeout=15)
+        resp.raise_for_status()
+        return Image.open(io.BytesIO(resp.content))
+
+    def _to_panel_layer(self, img, background=None):
+        """img をパネル中央に置いた RGBA レイヤーにする (アメッシュの画像は 770×480)"""
+        layer = Image.new("RGBA", PANEL, background or (0, 0, 0, 0))
+        img = img.convert("RGBA")
+        offset = ((PANEL[0] - img.width) // 2, (PANEL[1] - img.height) // 2)
+        layer.alpha_composite(img, offset)
+        return layer
+
+    def _layer(self, name, url, background=None):
+        path = os.path.join(CACHE_DIR, f"{name}_{PANEL[0]}x{PANEL[1]}.png")
+        if os.path.exists(path):
+            return Image.open(path).convert("RGBA")
+        layer = self._to_panel_layer(self._fetch_image(url), background)
+        layer.save(path)
+        return layer
+
+    def _static_layers(self):
+        if self._base is None:
+            self._base = self._layer("map", MAP_URL, MARGIN_COLOR + (255,))
+            self._mask = self._layer("mask", MASK_URL)
+        return self._base, self._mask
+
+    def _slot(self, now):
+        return now.replace(minute=now.minute - now.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+    def _fetch_mesh(self, now):
+        """公開済みの最新のレーダー画像と、その時刻"""
+        slot = self._slot(now)
+        for _ in range(MAX_SLOTS_BACK + 1):
+            try:
+                return self._fetch_image(MESH_URL.format(slot=slot.strftime("%Y%m%d%H%M"))), slot
+            except requests.HTTPError:
+                slot -= timedelta(minutes=SLOT_MINUTES)
+        raise RuntimeError("アメッシュのレーダー画像を取得できませんでした")
+
+    def render(self, now=None):
+        now = now or datetime.now(JST)
+        base, mask = self._static_layers()
+        mesh, slot = self._fetch_mesh(now)
+
+        img = base.copy()
+        img.alpha_composite(self._to_panel_layer(mesh))
+        img.alpha_composite(mask)
+        img = img.convert("RGB")
+
+        draw = ImageDraw.Draw(img)
+        try:
+            font = ImageFont.truetype(self.font_path, 20)
+        except Exception:
+            font = ImageFont.load_default()
+        draw.text((PANEL[0] - 140, 8), slot.strftime("%H:%M 時点"), font=font,
+                  fill=(30, 30, 30), stroke_width=2, stroke_fill=(255, 255, 255))
+        return img
@@ -0,0 +1,73 @@
+"""
+BarStore: StockUpdater の価格データ (終値) を SQLite に蓄積するストア。
+
+  - (銘柄, 足の種類, 時刻) ごとに 1 行。時刻は UTC の epoch 秒
+  - 同じ時刻の足は上書きする (当日分の足は取り直すたびに更新される)
+  - 取得に失敗しても、蓄積済みのデータはそのまま表示に使える
+"""
+
+import os
+import sqlite3
+import threading
+
+
+STORE_PATH = "./cache/stocks.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker   TEXT    NOT NULL,
+    interval TEXT    NOT NULL,
+    ts       INTEGER NOT NULL,
+    close    REAL    NOT NULL,
+    PRIMARY KEY (ticker, interval, ts)
+) WITHOUT ROWID
+"""
+
+
+class BarStore:
+
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def last_ts(self, ticker, interval):
+        """最後に保存した足の時刻 (なければ None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(ts) FROM bars WHERE ticker = ? AND interval = ?",
+                (ticker, interval)).fetchone()
+        return row[0]
+
+    def first_ts(self, ticker, interval):
+        """最初に保存した足の時刻 (なければ None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(ts) FROM bars WHERE ticker = ? AND interval = ?",
+                (ticker, interval)).fetchone()
+        return row[0]
+
+    def upsert(self, ticker, interval, rows):
+        """rows: [(ts, close), ...] を保存する。保存した件数を返す"""
+        rows = [(ticker, interval, int(ts), float(close)) for ts, close in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO bars (ticker, interval, ts, close) VALUES (?, ?, ?, ?)",
+                rows)
+        return len(rows)
+
+    def bars(self, ticker, interval, since=None):
+        """[(ts, close), ...] を時刻順に返す。since (epoch 秒) 以降のみに絞れる"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT ts, close FROM bars WHERE ticker = ? AND interval = ? AND ts >= ? ORDER BY ts",
+                (ticker, interval, since if since is not None else -2**62)).fetchall()
+
+    def prune(self, ticker, interval, before):
+        """before (epoch 秒) より前の足を削除する"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM bars WHERE ticker = ? AND interval = ? AND ts < ?",
+                (ticker, interval, before))
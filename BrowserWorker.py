@@ -0,0 +1,264 @@
+"""
+BrowserWorker: WebsiteUpdater / WeatherUpdater で共有する常駐ヘッドレス Firefox。
+
+  - 起動は初回のみ。uBlock もブラウザ起動時に一度だけ入れる
+  - スクリーンショットなどのジョブはキュー経由で 1 本のワーカースレッドが順に実行する
+  - ジョブの前にヘルスチェックを行い、応答がなければ再起動する
+  - MAX_JOBS 件ごと、またはプロセスツリーのメモリ使用量が MEMORY_LIMIT_MB を超えたら再起動する
+  - プロファイルは PROFILE_DIR に固定し、uBlock は初回に恒久インストールする。
+    HTTP ディスクキャッシュも PROFILE_DIR に残るので、再起動後もフォント・CSS・JS を再利用できる
+"""
+
+import atexit
+import glob
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import requests
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.firefox.service import Service
+
+
+MAX_JOBS        = 50
+MEMORY_LIMIT_MB = 1200
+JOB_TIMEOUT     = 180   # 1 ジョブの結果を待つ上限 (秒)
+UBLOCK_DIR      = "./ublock"
+PROFILE_DIR     = "./cache/firefox-profile"
+BAKED_MARKER    = ".epaper-baked"   # uBlock をインストール済みのプロファイルに置く印 (中身は xpi 名)
+DISK_CACHE_MB   = 256
+
+# ページは VIEWPORT (CSS px) でレイアウトし、パネル解像度 PANEL でラスタライズする
+VIEWPORT = (1200, 720)
+PANEL    = (800, 480)
+DEVICE_PIXEL_RATIO = PANEL[0] / VIEWPORT[0]
+
+
+def download_latest_ublock_firefox_xpi(dest_dir=UBLOCK_DIR):
+    os.makedirs(dest_dir, exist_ok=True)
+
+    for file in os.listdir(dest_dir):
+        if file.endswith(".firefox.signed.xpi"):
+            return os.path.join(dest_dir, file)
+
+    api = "https://api.github.com/repos/gorhill/uBlock/releases/latest"
+    r = requests.get(api, timeout=30)
+    r.raise_for_status()
+    data = r.json()
+
+    # uBlockのFirefox用xpi資産を探す（例: uBlock0_1.58.0.firefox.xpi）
+    asset = None
+    for a in data.get("assets", []):
+        name = a.get("name", "")
+        if name.endswith(".firefox.xpi") or name.endswith(".firefox.signed.xpi"):
+            asset = a
+            break
+    else:
+        raise RuntimeError("Firefox向けXPIが見つかりませんでした。")
+
+    url = asset["browser_download_url"]
+    xpi_path = os.path.join(dest_dir, asset["name"])
+    with requests.get(url, timeout=60, stream=True) as rr:
+        rr.raise_for_status()
+        with open(xpi_path, "wb") as f:
+            for chunk in rr.iter_content(chunk_size=8192):
+                if chunk:
+                    f.write(chunk)
+    return xpi_path
+
+
+def _process_tree_rss_mb(pid):
+    """pid とその子孫プロセスの VmRSS 合計 (MB)。/proc がなければ 0"""
+    children = {}
+    for stat in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(stat.split("/")[2]))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total_kb, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        stack.extend(children.get(p, []))
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def fit_viewport(driver, viewport=VIEWPORT):
+    """ウィンドウ枠の分を足して、表示領域がちょうど viewport (CSS px) になるようにする"""
+    driver.set_window_size(*viewport)
+    inner_w, inner_h, outer_w, outer_h = driver.execute_script(
+        "return [window.innerWidth, window.innerHeight, window.outerWidth, window.outerHeight];")
+    if (inner_w, inner_h) != tuple(viewport):
+        driver.set_window_size(viewport[0] + outer_w - inner_w, viewport[1] + outer_h - inner_h)
+
+
+class BrowserWorker:
+
+    def __init__(self, max_jobs=MAX_JOBS, memory_limit_mb=MEMORY_LIMIT_MB):
+        self.max_jobs = max_jobs
+        self.memory_limit_mb = memory_limit_mb
+        self.driver = None
+        self._jobs_since_start = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="browser-worker", daemon=True)
+        self._thread.start()
+
+    # ── 呼び出し側 ──────────────────────────────────────────────────────────
+
+    def submit(self, job) -> Future:
+        """job(driver) をワーカースレッドで実行する Future を返す"""
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def run(self, job, timeout=JOB_TIMEOUT):
+        return self.submit(job).result(timeout=timeout)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+    # ── ワーカースレッド ─────────────────────────────────────────────────────
+
+    def _start(self):
+        profile = os.path.abspath(PROFILE_DIR)
+        os.makedirs(profile, exist_ok=True)
+        # 前回異常終了したときのロックが残っていると起動できない
+        for lock in ("lock", ".parentlock", "parent.lock"):
+            path = os.path.join(profile, lock)
+            if os.path.lexists(path):
+                os.remove(path)
+
+        options = Options()
+        options.add_argument("-headless")
+        options.add_argument("-profile")
+        options.add_argument(profile)
+
+        # 画面サイズ: CSS 1px を 2/3 デバイス px で描画し、スクリーンショットをパネル解像度にする
+        options.set_preference("layout.css.devPixelsPerPx", f"{DEVICE_PIXEL_RATIO:.6f}")
+        # 静的アセットをプロファイル内のディスクキャッシュに残す
+        options.set_preference("browser.cache.disk.enable", True)
+        options.set_preference("browser.cache.disk.smart_size.enabled", False)
+        options.set_preference("browser.cache.disk.capacity", DISK_CACHE_MB * 1024)
+        options.set_preference("browser.cache.disk.parent_directory", profile)
+        options.set_preference("browser.sessionstore.resume_from_crash", False)
+
+        self.driver = webdriver.Firefox(service=Service(), options=options)
+        self._bake_profile(profile)
+        self._jobs_since_start = 0
+        print("BrowserWorker: Firefox を起動")
+
+    def _bake_profile(self, profile):
+        """初回だけ uBlock をプロファイルに恒久インストールする"""
+        marker = os.path.join(profile, BAKED_MARKER)
+        if os.path.exists(marker):
+            return
+        xpi_path = download_latest_ublock_firefox_xpi()
+        try:
+            self.driver.install_addon(xpi_path, temporary=False)
+            with open(marker, "w") as f:
+                f.write(os.path.basename(xpi_path))
+            print(f"BrowserWorker: uBlock をプロファイルにインストール ({os.path.basename(xpi_path)})")
+        except Exception as e:
+            # 署名なしの xpi などは恒久インストールできないので、この起動の間だけ入れる
+            print(f"BrowserWorker: uBlock の恒久インストールに失敗 ({e})")
+            self.driver.install_addon(xpi_path, temporary=True)
+        finally:
+            for file in glob.glob(os.path.join("/tmp", "*.xpi")):
+                os.remove(file)
+
+    def _stop(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"BrowserWorker: 終了時のエラー {e}")
+        finally:
+            self.driver = None
+
+    def _healthy(self):
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _memory_mb(self):
+        pid = self.driver.capabilities.get("moz:processID")
+        return _process_tree_rss_mb(pid) if pid else 0
+
+    def _ensure_browser(self):
+        reason = None
+        if self.driver is None:
+            reason = "start"
+        elif self._jobs_since_start >= self.max_jobs:
+            reason = f"{self._jobs_since_start} jobs"
+        elif not self._healthy():
+            reason = "health check failed"
+        else:
+            mem = self._memory_mb()
+            if mem > self.memory_limit_mb:
+                reason = f"memory {mem:.0f} MB"
+        if reason:
+            if self.driver is not None:
+                print(f"BrowserWorker: 再起動 ({reason})")
+            self._stop()
+            self._start()
+
+    def _reset_tabs(self):
+        """ジョブ後にタブを 1 つだけ残して空白ページに戻す"""
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._stop()
+                return
+            job, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._ensure_browser()
+                self._jobs_since_start += 1
+                future.set_result(job(self.driver))
+            except Exception as e:
+                future.set_exception(e)
+            try:
+                if self.driver is not None:
+                    self._reset_tabs()
+            except Exception:
+                # 応答しないブラウザは次のジョブの前に起動し直す
+                self._stop()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker() -> BrowserWorker:
+    """プロセス内で共有する BrowserWorker (初回呼び出し時に生成)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = BrowserWorker()
+            atexit.register(_worker.shutdown)
+        return _worker
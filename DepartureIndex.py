@@ -0,0 +1,115 @@
+"""
+DepartureIndex: ODPT の駅・バス停時刻表を (停留所, 方面, カレンダー) ごとの
+発車時刻 (0 時起点の分) 昇順配列にコンパイルし、次の N 本を bisect で引く。
+
+  - 行き先・種別などの表示文字列は一度だけ翻訳して id に置き換え、配列には id だけを持つ
+  - 深夜 0 時以降の発車 (ODPT の "24:10" 表記や、並びの末尾に現れる "00:10") は
+    その運行日の 24:00 以降 (1440 分以上) として扱う
+  - 始発前の深夜帯は前日の運行日の時刻表も引く
+"""
+
+from array import array
+from bisect import bisect_left
+
+
+DAY_MINUTES       = 24 * 60
+SERVICE_DAY_START = 3 * 60   # これより前の時刻は前日の運行日として扱う
+
+
+def parse_minutes(hhmm: str) -> int:
+    """"HH:MM" → 分 (24 時以降の表記もそのまま受け付ける)"""
+    h, m = hhmm.split(":")[:2]
+    return int(h) * 60 + int(m)
+
+
+def fmt_minutes(minutes: int) -> str:
+    """分 → "HH:MM" (24 時以降は 0 時台に戻して表示)"""
+    minutes %= DAY_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def service_minutes(times: list[str]) -> list[int]:
+    """時刻表の並び順の時刻 → 運行日基準の分。並びが巻き戻った以降は翌日分として +1440"""
+    out, offset, prev = [], 0, -1
+    for t in times:
+        m = parse_minutes(t)
+        if m + offset < prev - DAY_MINUTES // 2:
+            offset += DAY_MINUTES
+        prev = m + offset
+        out.append(prev)
+    return out
+
+
+class DepartureIndex:
+
+    def __init__(self):
+        self.labels: list[str] = []        # id → 表示文字列
+        self._label_ids: dict[str, int] = {}
+        # (stop, direction, calendar) → (分, ラベル id 1, ラベル id 2) の昇順配列
+        self._tables: dict[tuple, tuple[array, array, array]] = {}
+        # stop → {direction: 表示名} (登録順)
+        self.directions: dict[str, dict[str, str]] = {}
+        # stop → {calendar, ...}
+        self.calendars: dict[str, set[str]] = {}
+
+    def intern(self, text: str) -> int:
+        i = self._label_ids.get(text)
+        if i is None:
+            i = self._label_ids[text] = len(self.labels)
+            self.labels.append(text)
+        return i
+
+    def clear(self, stop: str):
+        """stop の登録内容をすべて削除する (時刻表改訂時の再コンパイル用)"""
+        for key in [k for k in self._tables if k[0] == stop]:
+            del self._tables[key]
+        self.directions.pop(stop, None)
+        self.calendars.pop(stop, None)
+
+    def add(self, stop: str, direction: str, direction_label: str, calendar: str,
+            departures, unique_minutes: bool = False):
+        """departures: [(分, ラベル1, ラベル2), ...] を登録する。
+        unique_minutes=True なら同じ発車時刻は最初の 1 本だけ、False なら完全一致のみ除く。"""
+        self.directions.setdefault(stop, {}).setdefault(direction, direction_label)
+        self.calendars.setdefault(stop, set()).add(calendar)
+
+        key = (stop, direction, calendar)
+        rows = {}
+        for row in zip(*self._tables.get(key, ((), (), ()))):
+            rows[row[0] if unique_minutes else row] = row
+        for m, la, lb in departures:
+            row = (m, self.intern(la), self.intern(lb))
+            rows.setdefault(row[0] if unique_minutes else row, row)
+
+        ordered = sorted(rows.values())
+        self._tables[key] = (
+            array("H", (r[0] for r in ordered)),
+            array("H", (r[1] for r in ordered)),
+            array("H", (r[2] for r in ordered)),
+        )
+
+    def has_departures(self, stop: str, direction: str, calendars) -> bool:
+        return any((stop, direction, cal) in self._tables for cal in calendars)
+
+    def _scan(self, key: tuple, minute: int, n: int) -> list[tuple]:
+        table = self._tables.get(key)
+        if table is None:
+            return []
+        mins, la, lb = table
+        i = bisect_left(mins, minute)
+        return [(mins[j], la[j], lb[j]) for j in range(i, min(i + n, len(mins)))]
+
+    def next_departures(self, stop: str, direction: str, calendars: list[str], minute: int,
+                        n: int, prev_calendars: list[str] = ()) -> list[tuple[str, str, str]]:
+        """minute (当日 0 時起点の分) 以降の n 本 → [("HH:MM", ラベル1, ラベル2), ...]
+        prev_calendars は前日の運行日に該当するカレンダー (深夜帯のみ参照)"""
+        found = []
+        for cal in calendars:
+            found += [(m - minute, m, a, b)
+                      for m, a, b in self._scan((stop, direction, cal), minute, n)]
+        if minute < SERVICE_DAY_START:
+            for cal in prev_calendars:
+                found += [(m - DAY_MINUTES - minute, m, a, b)
+                          for m, a, b in self._scan((stop, direction, cal), minute + DAY_MINUTES, n)]
+        found = sorted(set(found))
+        return [(fmt_minutes(m), self.labels[a], self.labels[b]) for _, m, a, b in found[:n]]
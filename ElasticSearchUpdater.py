@@ -5,16 +5,21 @@ prometheus-community/elasticsearch_exporter のメトリクスを使用。
 
 画面構成:
   画面1 — クラスタ概要 (status / nodes / shards / 総docs・store / QPS)
-  画面2 — インデックス別 health・docs・store・Δ10m (前半, 2列)
-  画面3 — インデックス別 health・docs・store・Δ10m (後半, 2列)
+  画面2 — インデックス別 health・docs・store・Δ10m (docs 上位 前半, 2列)
+  画面3 — インデックス別 health・docs・store・Δ10m (docs 上位 後半, 2列)
+
+インデックスは docs の降順 (同数ならインデックス名順) に並べ、表示するページ分
+(page_offset から 2 画面分) だけを、直前のページの最後の行を起点に topk で取得する。
+rotate=True ではカーソルを更新ごとに 2 ページずつ進め、全インデックスを巡回する。
+各ページは page_ttl を過ぎるまでキャッシュを再利用する。
 """
 
 from PIL import Image, ImageDraw
 from PrometheusBase import (
-    PrometheusBase,
+    PrometheusBase, PROMETHEUS_URL,
     COLOR_BG, COLOR_FG, COLOR_SUB, COLOR_OK, COLOR_WARN, COLOR_CRIT,
     COLOR_NEUTRAL, COLOR_BORDER,
-    FONT_REG, FONT_BOLD, _load_font,
+    FONT_REG, FONT_BOLD, _load_font, _label_regex,
 )
 
 
@@ -33,6 +38,10 @@ DELTA_X  = 318   # Δ10m
 STATUS_X = 354   # health テキスト (YELLOW/RED)
 NAME_MAX = 22    # (NAME_X + NAME_MAX*7 ≈ DOCS_X)
 
+# 内部インデックス (.*) を除外したインデックス別ドキュメント数
+# {match} には _query_ranked が index のマッチャを差し込む
+IDX_DOCS = r'sum by (index) (elasticsearch_indices_docs_primary{{index!~"\\..*"{match}}})'
+
 
 def _fmt_docs(n: float) -> str:
     if n >= 1_000_000_000:
@@ -83,6 +92,17 @@ def _idx_dot_color(idx_health: dict, index: str) -> tuple:
 
 class ElasticSearchUpdater(PrometheusBase):
 
+    def __init__(self, prom_url: str = PROMETHEUS_URL,
+                 page_size: int = ROWS_PER_SCR, page_offset: int = 0, rotate: bool = False):
+        """page_size: 1 画面あたりのインデックス行数, page_offset: 先頭に表示する順位 (0 始まり)
+        rotate: True なら page_offset を起点に更新ごとに次のページへ進む"""
+        super().__init__(prom_url)
+        self.page_size   = min(page_size, ROWS_PER_SCR)
+        self.page_offset = page_offset
+        self.rotate      = rotate
+        self._cursor     = page_offset
+        self._after      = None   # rotate 時、_cursor 件目の直前のインデックスの (docs, index)
+
     # ── Prometheus クエリ ─────────────────────────────────────────────────────
 
     def _collect_es_metrics(self) -> dict:
@@ -123,26 +143,89 @@ class ElasticSearchUpdater(PrometheusBase):
         m["index_qps"]       = self._query(
             "rate(elasticsearch_indices_indexing_index_total[5m])", key="name"
         )
-        # インデックス別
-        m["idx_docs"]  = self._query(
-            "sum by (index) (elasticsearch_indices_docs_primary)", key="index"
-        )
-        m["idx_delta"] = self._query(
-            "sum by (index) (elasticsearch_indices_docs_primary)"
-            " - sum by (index) (elasticsearch_indices_docs_primary offset 10m)",
-            key="index",
-        )
-        m["idx_store"]  = self._query(
-            "sum by (index) (elasticsearch_indices_store_size_bytes_total)", key="index"
+        m["idx_count"]       = self._query_scalar(f"count({IDX_DOCS.format(match='')})")
+        return m
+
+    def _collect_index_page(self, after: tuple | None) -> tuple[list[tuple], tuple | None]:
+        """after = (docs, index) の次から 1 画面分の行 [(name, hcolor, docs, store, delta)] と、
+        次のページの after"""
+        ranked = self._query_ranked(IDX_DOCS, limit=self.page_size, after=after, key="index")
+        d = self._collect_index_details([idx for idx, _ in ranked])
+
+        # docs 降順・同数ならインデックス名順 (_query_ranked の順)
+        rows: list[tuple[str, tuple, float, float, float | None]] = []
+        for idx, docs in ranked:
+            store = d["idx_store"].get(idx, 0)
+            delta = d["idx_delta"].get(idx)
+            hcolor = _idx_dot_color(d["idx_health"], idx)
+            rows.append((idx, hcolor, max(docs, 0), store, delta))
+        return rows, ((ranked[-1][1], ranked[-1][0]) if ranked else after)
+
+    def _index_page(self, after: tuple | None) -> tuple[list[tuple], tuple | None]:
+        return self._cached_page(("indices", after), lambda: self._collect_index_page(after))
+
+    def _collect_index_details(self, indices: list[str]) -> dict:
+        """指定インデックスのみの store / Δ10m / health"""
+        if not indices:
+            return {"idx_delta": {}, "idx_store": {}, "idx_health": {}}
+        sel = f'{{index=~"{_label_regex(indices)}"}}'
+        return {
+            "idx_delta": self._query(
+                f"sum by (index) (elasticsearch_indices_docs_primary{sel})"
+                f" - sum by (index) (elasticsearch_indices_docs_primary{sel} offset 10m)",
+                key="index",
+            ),
+            "idx_store": self._query(
+                f"sum by (index) (elasticsearch_indices_store_size_bytes_total{sel})",
+                key="index",
+            ),
+            # 値が 1 の色だけを返させる
+            "idx_health": self._query_multi(
+                f"elasticsearch_index_health_status{sel} == 1", ["index", "color"]
+            ),
+        }
+
+    # ── view-model (表示文字列・色に整形済み) ──────────────────────────────────
+
+    def _vm_cluster(self, m: dict) -> tuple:
+        stats = (
+            ("Nodes",      m["nodes"],          COLOR_FG),
+            ("Data",       m["data_nodes"],      COLOR_FG),
+            ("Shards",     m["shards"],          COLOR_FG),
+            ("Primary",    m["primary_shards"],  COLOR_FG),
+            ("Unassigned", m["unassigned"],      COLOR_OK if (m["unassigned"] or 0) == 0 else COLOR_CRIT),
+            ("Relocating", m["relocating"],      COLOR_FG),
+            ("Pending",    m["pending_tasks"],   COLOR_OK if (m["pending_tasks"] or 0) == 0 else COLOR_WARN),
         )
-        m["idx_health"] = self._query_multi(
-            "elasticsearch_index_health_status", ["index", "color"]
+        nodes = []
+        for node in sorted(set(m["search_qps"]) | set(m["index_qps"])):
+            sq = m["search_qps"].get(node)
+            iq = m["index_qps"].get(node)
+            nodes.append((node[:20], f"{sq:.1f}" if sq else "—", f"{iq:.1f}" if iq else "—"))
+        return (
+            _status_color(m["cluster_status"]),
+            tuple((label, str(int(value or 0)), color) for label, value, color in stats),
+            _fmt_docs(m["total_docs"] or 0),
+            _fmt_bytes(m["store_bytes"] or 0),
+            tuple(nodes),
         )
-        return m
+
+    def _vm_indices(self, rows: list[tuple], page: str) -> tuple:
+        out = []
+        for name, hcolor, docs, store, delta in rows:
+            if hcolor == COLOR_CRIT:
+                status = ("RED",    COLOR_CRIT)
+            elif hcolor == COLOR_WARN:
+                status = ("YELLOW", COLOR_WARN)
+            else:
+                status = ("GREEN",  COLOR_OK)
+            out.append((name[:NAME_MAX], hcolor, _fmt_docs(docs), _fmt_bytes(store),
+                        *_fmt_delta(delta), *status))
+        return page, tuple(out)
 
     # ── 画面1: クラスタ概要 ───────────────────────────────────────────────────
 
-    def _screen_cluster(self, m: dict) -> Image.Image:
+    def _screen_cluster(self, vm: tuple) -> Image.Image:
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         draw   = ImageDraw.Draw(canvas)
 
@@ -153,37 +236,29 @@ class ElasticSearchUpdater(PrometheusBase):
         f_val    = _load_font(FONT_BOLD, 13)
         f_sub    = _load_font(FONT_REG,  11)
 
+        (status_str, status_color), stats, total_docs, store, nodes = vm
+
         draw.text((8, 6), "Elasticsearch", font=f_title, fill=COLOR_FG)
         draw.line([(0, 26), (800, 26)], fill=COLOR_BORDER, width=1)
 
         # ── ステータス ──
-        status_str, status_color = _status_color(m["cluster_status"])
         draw.ellipse((12, 36, 28, 52), fill=status_color)
         draw.text((36, 34), status_str, font=f_status, fill=status_color)
 
         # ── ノード / シャード統計 ──
-        stats = [
-            ("Nodes",      m["nodes"],          COLOR_FG),
-            ("Data",       m["data_nodes"],      COLOR_FG),
-            ("Shards",     m["shards"],          COLOR_FG),
-            ("Primary",    m["primary_shards"],  COLOR_FG),
-            ("Unassigned", m["unassigned"],      COLOR_OK if (m["unassigned"] or 0) == 0 else COLOR_CRIT),
-            ("Relocating", m["relocating"],      COLOR_FG),
-            ("Pending",    m["pending_tasks"],   COLOR_OK if (m["pending_tasks"] or 0) == 0 else COLOR_WARN),
-        ]
         stat_w = 110
         for i, (label, value, color) in enumerate(stats):
             sx = 8 + i * stat_w
             draw.text((sx, 62), label, font=f_sub, fill=COLOR_SUB)
-            draw.text((sx, 76), str(int(value or 0)), font=f_val, fill=color)
+            draw.text((sx, 76), value, font=f_val, fill=color)
 
         draw.line([(0, 96), (800, 96)], fill=COLOR_BORDER, width=1)
 
         # ── 総ドキュメント数・ストレージ ──
         draw.text((8,   102), "Total Docs", font=f_lbl, fill=COLOR_SUB)
-        draw.text((120, 102), _fmt_docs(m["total_docs"] or 0), font=f_val, fill=COLOR_FG)
+        draw.text((120, 102), total_docs, font=f_val, fill=COLOR_FG)
         draw.text((260, 102), "Store", font=f_lbl, fill=COLOR_SUB)
-        draw.text((310, 102), _fmt_bytes(m["store_bytes"] or 0), font=f_val, fill=COLOR_FG)
+        draw.text((310, 102), store, font=f_val, fill=COLOR_FG)
 
         draw.line([(0, 120), (800, 120)], fill=COLOR_BORDER, width=1)
 
@@ -193,14 +268,11 @@ class ElasticSearchUpdater(PrometheusBase):
         draw.text((400, 126), "Index QPS",  font=f_hdr, fill=COLOR_SUB)
         draw.line([(0, 140), (800, 140)], fill=COLOR_BORDER, width=1)
 
-        all_nodes = sorted(set(m["search_qps"]) | set(m["index_qps"]))
-        for idx, node in enumerate(all_nodes):
+        for idx, (node, sq, iq) in enumerate(nodes):
             y  = 144 + idx * 24
-            sq = m["search_qps"].get(node)
-            iq = m["index_qps"].get(node)
-            draw.text((8,   y), node[:20],                  font=f_val, fill=COLOR_FG)
-            draw.text((200, y), f"{sq:.1f}" if sq else "—", font=f_val, fill=COLOR_NEUTRAL)
-            draw.text((400, y), f"{iq:.1f}" if iq else "—", font=f_val, fill=COLOR_NEUTRAL)
+            draw.text((8,   y), node, font=f_val, fill=COLOR_FG)
+            draw.text((200, y), sq,   font=f_val, fill=COLOR_NEUTRAL)
+            draw.text((400, y), iq,   font=f_val, fill=COLOR_NEUTRAL)
             draw.line([(0, y + 22), (800, y + 22)], fill=(230, 230, 230), width=1)
 
         self._stamp(canvas, "Elasticsearch")
@@ -208,7 +280,7 @@ class ElasticSearchUpdater(PrometheusBase):
 
     # ── 画面2・3: インデックス別詳細 (2列) ──────────────────────────────────
 
-    def _screen_indices(self, rows: list[tuple], offset: int, page: str) -> Image.Image:
+    def _screen_indices(self, vm: tuple) -> Image.Image:
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         draw   = ImageDraw.Draw(canvas)
 
@@ -217,6 +289,7 @@ class ElasticSearchUpdater(PrometheusBase):
         f_body  = _load_font(FONT_REG,  11)
         f_val   = _load_font(FONT_BOLD, 11)
 
+        page, rows = vm
         draw.text((8, 6), f"Elasticsearch Indices  ({page})", font=f_title, fill=COLOR_FG)
         draw.line([(0, 26), (800, 26)], fill=COLOR_BORDER, width=1)
 
@@ -233,8 +306,9 @@ class ElasticSearchUpdater(PrometheusBase):
 
         for col_idx in range(2):
             cx      = col_idx * COL_W
-            col_off = offset + col_idx * ROWS_PER_COL
-            for row_idx, (name, hcolor, docs, store, delta) in enumerate(
+            col_off = col_idx * ROWS_PER_COL
+            for row_idx, (name, hcolor, docs, store, delta_str, delta_color,
+                          status_str, status_color) in enumerate(
                 rows[col_off: col_off + ROWS_PER_COL]
             ):
                 y = ROW_START_Y + row_idx * ROW_H
@@ -244,17 +318,10 @@ class ElasticSearchUpdater(PrometheusBase):
                 elif hcolor == COLOR_WARN:
                     draw.rectangle([cx, y, cx + COL_W - 1, y + ROW_H - 2], fill=(255, 250, 220))
                 draw.ellipse((cx + 8, y + 6, cx + 16, y + 14), fill=hcolor)
-                draw.text((cx + NAME_X,  y + 2), name[:NAME_MAX],  font=f_body, fill=COLOR_FG)
-                draw.text((cx + DOCS_X,  y + 2), _fmt_docs(docs),  font=f_val,  fill=COLOR_FG)
-                draw.text((cx + STORE_X, y + 2), _fmt_bytes(store), font=f_val,  fill=COLOR_FG)
-                delta_str, delta_color = _fmt_delta(delta)
-                draw.text((cx + DELTA_X,  y + 2), delta_str, font=f_body, fill=delta_color)
-                if hcolor == COLOR_CRIT:
-                    status_str, status_color = "RED",    COLOR_CRIT
-                elif hcolor == COLOR_WARN:
-                    status_str, status_color = "YELLOW", COLOR_WARN
-                else:
-                    status_str, status_color = "GREEN",  COLOR_OK
+                draw.text((cx + NAME_X,  y + 2), name,  font=f_body, fill=COLOR_FG)
+                draw.text((cx + DOCS_X,  y + 2), docs,  font=f_val,  fill=COLOR_FG)
+                draw.text((cx + STORE_X, y + 2), store, font=f_val,  fill=COLOR_FG)
+                draw.text((cx + DELTA_X,  y + 2), delta_str,  font=f_body, fill=delta_color)
                 draw.text((cx + STATUS_X, y + 2), status_str, font=f_body, fill=status_color)
                 draw.line([(cx, y + ROW_H - 1), (cx + COL_W - 1, y + ROW_H - 1)],
                           fill=(230, 230, 230), width=1)
@@ -264,24 +331,41 @@ class ElasticSearchUpdater(PrometheusBase):
 
     # ── エントリポイント ───────────────────────────────────────────────────────
 
+    def _page_label(self, offset: int, total: int) -> str:
+        """"3/12" 形式 — 全インデックス数から算出したページ番号"""
+        pages = max((total + self.page_size - 1) // self.page_size, 1)
+        return f"{offset // self.page_size + 1}/{pages}"
+
     def update(self):
         print("[ElasticSearchUpdater] メトリクス取得中...")
         m = self._collect_es_metrics()
-
-        # 内部インデックス (.*) を除外し、名前昇順でソート
-        rows: list[tuple[str, tuple, float, float, float | None]] = []
-        for idx in sorted(k for k in m["idx_docs"] if not k.startswith(".")):
-            docs  = max(m["idx_docs"].get(idx, 0), 0)
-            store = m["idx_store"].get(idx, 0)
-            delta = m["idx_delta"].get(idx)
-            hcolor = _idx_dot_color(m["idx_health"], idx)
-            rows.append((idx, hcolor, docs, store, delta))
-
-        img1 = self._screen_cluster(m)
-        img2 = self._screen_indices(rows, offset=0,            page="1/2")
-        img3 = self._screen_indices(rows, offset=ROWS_PER_SCR, page="2/2")
-
-        self.image_request([img1, img2, img3])
+        total = int(m["idx_count"] or 0)
+
+        offset = self._cursor if self.rotate else self.page_offset
+        after  = self._after if self.rotate else None
+        if offset >= total:
+            offset, after = 0, None
+        if offset and after is None:
+            after = self._seek_ranked(IDX_DOCS, offset, self.page_size, key="index")
+
+        # ページは直前のページの最後の行の次から (キーセット方式)
+        pages = []
+        for o in (offset, offset + self.page_size):
+            rows = []
+            if o < total:
+                rows, after = self._index_page(after)
+            pages.append(self._vm_indices(rows, page=self._page_label(o, total)))
+
+        if self.rotate:
+            self._cursor, self._after = offset + 2 * self.page_size, after
+            if self._cursor >= total:
+                self._cursor, self._after = 0, None
+
+        self._push_screens([
+            (self._vm_cluster(m), self._screen_cluster),
+            (pages[0],            self._screen_indices),
+            (pages[1],            self._screen_indices),
+        ])
 
 
 if __name__ == "__main__":
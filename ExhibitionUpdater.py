@@ -1,15 +1,28 @@
 from ImageUpdater import ImageUpdater
 import requests
+import hashlib
 import io
 import re
 import json
 import os
 import random
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta, timezone
 from PIL import Image, ImageDraw, ImageFont
 
 CACHE_PATH = "./cache/exhibitions.json"
 CACHE_TTL_HOURS = 24
+STORE_VERSION = 2   # キャッシュの形式 (描画に使う項目だけのコンパクト形式)
+
+# セルサイズにリサイズ済みのポスター (URL とサイズごとに 1 ファイル)
+POSTER_CACHE_DIR = "./cache/posters"
+POSTER_CACHE_DAYS = 14   # これより長く使われていないポスターは削除
+POSTER_WORKERS = 6
+
+CELL_W, CELL_H = 400, 240
+# ポスターを黒と alpha=0.52 で合成したのと同じ暗さにする LUT (R, G, B)
+DARKEN_LUT = [round(v * 0.48) for v in range(256)] * 3
 
 # カテゴリ → 背景色（薄めのトーン）
 CATEGORY_COLORS = {
@@ -40,6 +53,85 @@ CLOSED_JP = {
 }
 
 
+ALLOW_PREFECTURES = {"神奈川県", "千葉県", "埼玉県"}
+
+
+def _in_target_area(area):
+    """東京・神奈川・千葉・埼玉の会場のみ True を返す。
+    東京の会場は地区名（例: "清澄白河、両国"）、他県は県名（例: "神奈川県"）で入っている。"""
+    # 県・府・道で終わる → 明示的な都道府県名。対象外県は除外
+    if area.endswith(("県", "府", "道")):
+        return area in ALLOW_PREFECTURES
+    # それ以外は東京の地区名とみなして含める
+    return True
+
+
+def _ordinal(d):
+    """"YYYY-MM-DD" → date.toordinal()。解釈できなければ None"""
+    try:
+        return date.fromisoformat(d).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _compact_event(event):
+    """__NEXT_DATA__ のイベント → 描画に使う項目だけの dict"""
+    venue = event.get("venue", {}).get("fields", {})
+    area = venue.get("localArea", {}).get("fields", {}).get("name", "")
+    categories = [c.get("fields", {}).get("name", "") for c in event.get("categories", [])]
+    bg = next((CATEGORY_COLORS[c] for c in categories if c in CATEGORY_COLORS), DEFAULT_BG)
+    return {
+        "name":       event.get("eventName", ""),
+        "venue":      venue.get("fullName", ""),
+        "area":       area,
+        "in_area":    _in_target_area(area),
+        "categories": categories[:2],
+        "bg":         list(bg),
+        "closed":     event.get("closedDays", []),
+        "starts":     event.get("scheduleStartsOn", ""),
+        "ends":       event.get("scheduleEndsOn", ""),
+        "start":      _ordinal(event.get("scheduleStartsOn", "")),
+        "end":        _ordinal(event.get("scheduleEndsOn", "")),
+        "poster":     (event.get("imageposter", {}).get("fields", {})
+                           .get("file", {}).get("url", "")),
+    }
+
+
+class EventStore:
+    """人気順に並べたコンパクトなイベント列と、会期の区間索引。
+    by_start / by_end は対象エリアかつ会期終了日のあるイベントの添字を開始日順・終了日順に並べたもの。"""
+
+    def __init__(self, events, by_start, by_end):
+        self.events = events
+        self.by_start = by_start
+        self.by_end = by_end
+        self._starts = [events[i]["start"] or 0 for i in by_start]
+        self._ends = [events[i]["end"] for i in by_end]
+
+    @classmethod
+    def from_raw(cls, raw_events):
+        ranked = sorted(raw_events, key=lambda e: e.get("popularity", 0), reverse=True)
+        events = [_compact_event(e) for e in ranked]
+        indexed = [i for i, e in enumerate(events) if e["in_area"] and e["end"] is not None]
+        by_start = sorted(indexed, key=lambda i: events[i]["start"] or 0)
+        by_end = sorted(indexed, key=lambda i: events[i]["end"])
+        return cls(events, by_start, by_end)
+
+    def to_json(self):
+        return {"events": self.events, "by_start": self.by_start, "by_end": self.by_end}
+
+    def active(self, day):
+        """day に開催中のイベント (人気順)"""
+        t = day.toordinal()
+        started = self.by_start[:bisect_right(self._starts, t)]   # 開始日 <= t
+        not_ended = self.by_end[bisect_left(self._ends, t):]      # 終了日 >= t
+        if len(started) <= len(not_ended):
+            hits = [i for i in started if self.events[i]["end"] >= t]
+        else:
+            hits = [i for i in not_ended if (self.events[i]["start"] or 0) <= t]
+        return [self.events[i] for i in sorted(hits)]
+
+
 class ExhibitionUpdater(ImageUpdater):
 
     def __init__(self):
@@ -47,19 +139,33 @@ class ExhibitionUpdater(ImageUpdater):
         self.FONT_BOLD_PATH = "./fonts/NotoSansJP-Bold.ttf"
         self.FONT_REG_PATH = "./fonts/NotoSansJP-Regular.ttf"
         os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        os.makedirs(POSTER_CACHE_DIR, exist_ok=True)
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=POSTER_WORKERS))
+        self._posters = {}   # 今回の更新で読み込んだポスター (url, w, h) → Image
+        self._store = None   # 読み込み済みの EventStore とその取得日時
+        self._fonts = None
+        self._cells = {}     # _cell_key → 描画済みセル
+        self._store_at = None
 
     def fetch_events(self):
-        """キャッシュが24時間以上古ければ再取得、それ以外はキャッシュを返す。"""
+        """キャッシュが24時間以上古ければ再取得、それ以外はキャッシュの EventStore を返す。"""
         JST = timezone(timedelta(hours=9))
         now = datetime.now(JST)
 
+        if self._store is not None and (now - self._store_at).total_seconds() < CACHE_TTL_HOURS * 3600:
+            return self._store
+
         if os.path.exists(CACHE_PATH):
             with open(CACHE_PATH, "r", encoding="utf-8") as f:
                 cache = json.load(f)
             cached_at = datetime.fromisoformat(cache["cached_at"])
-            if (now - cached_at).total_seconds() < CACHE_TTL_HOURS * 3600:
+            if ((now - cached_at).total_seconds() < CACHE_TTL_HOURS * 3600
+                    and cache.get("version") == STORE_VERSION):
                 print(f"ExhibitionUpdater: キャッシュを使用 ({cache['cached_at']})")
-                return cache["events"]
+                self._store = EventStore(cache["events"], cache["by_start"], cache["by_end"])
+                self._store_at = cached_at
+                return self._store
 
         print("ExhibitionUpdater: Tokyo Art Beat から取得中...")
         html = requests.get(
@@ -80,46 +186,20 @@ class ExhibitionUpdater(ImageUpdater):
         key = list(fallback.keys())[0]
         events = fallback[key]["data"]
 
+        store = EventStore.from_raw(events)
         with open(CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump({"cached_at": now.isoformat(), "events": events}, f, ensure_ascii=False)
+            json.dump({"cached_at": now.isoformat(), "version": STORE_VERSION, **store.to_json()},
+                      f, ensure_ascii=False, separators=(",", ":"))
 
         print(f"ExhibitionUpdater: {len(events)} 件取得、キャッシュ保存完了")
-        return events
-
-    def _in_target_area(self, event):
-        """東京・神奈川・千葉・埼玉の会場のみ True を返す。
-        東京の会場は地区名（例: "清澄白河、両国"）、他県は県名（例: "神奈川県"）で入っている。"""
-        area = (event.get("venue", {})
-                     .get("fields", {})
-                     .get("localArea", {})
-                     .get("fields", {})
-                     .get("name", ""))
-        ALLOW_PREFECTURES = {"神奈川県", "千葉県", "埼玉県"}
-        # 県・府・道で終わる → 明示的な都道府県名。対象外県は除外
-        if area.endswith(("県", "府", "道")):
-            return area in ALLOW_PREFECTURES
-        # それ以外は東京の地区名とみなして含める
-        return True
-
-    def get_active_events(self, events):
-        today = date.today().isoformat()
-        active = [
-            e for e in events
-            if e.get("scheduleStartsOn", "") <= today <= e.get("scheduleEndsOn", "")
-            and self._in_target_area(e)
-        ]
-        active.sort(key=lambda e: e.get("popularity", 0), reverse=True)
-        return active
-
-    def _bg_color(self, categories):
-        for cat in categories:
-            name = cat.get("fields", {}).get("name", "")
-            if name in CATEGORY_COLORS:
-                return CATEGORY_COLORS[name]
-        return DEFAULT_BG
+        self._store, self._store_at = store, now
+        return store
+
+    def get_active_events(self, store):
+        return store.active(date.today())
 
     def _closed_str(self, event):
-        closed = event.get("closedDays", [])
+        closed = event["closed"]
         if not closed:
             return ""
         jp = [CLOSED_JP.get(d, d) for d in closed]
@@ -127,41 +207,61 @@ class ExhibitionUpdater(ImageUpdater):
 
     def _badge(self, event):
         """NEW / まもなく終了 バッジ文字列を返す。両方該当する場合はまもなく終了優先。"""
-        today = date.today()
-        ends = event.get("scheduleEndsOn", "")
-        starts = event.get("scheduleStartsOn", "")
-        try:
-            end_date = date.fromisoformat(ends)
-            if (end_date - today).days <= 7:
-                return ("まもなく終了", (200, 60, 60))
-        except ValueError:
-            pass
-        try:
-            start_date = date.fromisoformat(starts)
-            if (today - start_date).days <= 7:
-                return ("NEW", (46, 140, 80))
-        except ValueError:
-            pass
+        today = date.today().toordinal()
+        if event["end"] is not None and event["end"] - today <= 7:
+            return ("まもなく終了", (200, 60, 60))
+        if event["start"] is not None and today - event["start"] <= 7:
+            return ("NEW", (46, 140, 80))
         return None
 
+    def _poster_path(self, url, cell_w, cell_h):
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(POSTER_CACHE_DIR, f"{name}_{cell_w}x{cell_h}.jpg")
+
     def _fetch_poster(self, event, cell_w, cell_h):
-        """ポスター画像を取得してセルサイズにリサイズして返す。失敗時は None。"""
+        """ポスター画像をセルサイズで返す。失敗時は None。
+        ディスクに保存済みならそれを使い、なければ取得してリサイズ・保存する。"""
+        url = event["poster"]
+        if not url:
+            return None
+        key = (url, cell_w, cell_h)
+        if key in self._posters:
+            return self._posters[key]
+
+        path = self._poster_path(url, cell_w, cell_h)
         try:
-            url = (event.get("imageposter", {})
-                        .get("fields", {})
-                        .get("file", {})
-                        .get("url", ""))
-            if not url:
-                return None
-            # Contentful Images API でJPEGに変換しリサイズ
-            full_url = f"https:{url}?fm=jpg&w={cell_w}&h={cell_h}&fit=fill"
-            resp = requests.get(full_url, timeout=10)
-            resp.raise_for_status()
-            poster = Image.open(io.BytesIO(resp.content)).convert("RGB")
-            poster = poster.resize((cell_w, cell_h), Image.LANCZOS)
-            return poster
+            if os.path.exists(path):
+                poster = Image.open(path).convert("RGB")
+                os.utime(path)
+            else:
+                # Contentful Images API でJPEGに変換しリサイズ
+                full_url = f"https:{url}?fm=jpg&w={cell_w}&h={cell_h}&fit=fill"
+                resp = self.session.get(full_url, timeout=10)
+                resp.raise_for_status()
+                poster = Image.open(io.BytesIO(resp.content)).convert("RGB")
+                if poster.size != (cell_w, cell_h):
+                    poster = poster.resize((cell_w, cell_h), Image.LANCZOS)
+                    poster.save(path, format="JPEG", quality=90)
+                else:
+                    with open(path, "wb") as f:
+                        f.write(resp.content)
         except Exception:
-            return None
+            poster = None
+        self._posters[key] = poster
+        return poster
+
+    def prefetch_posters(self, events, cell_w=CELL_W, cell_h=CELL_H):
+        """events のポスターをまとめて並行に読み込む"""
+        unique = {e["poster"]: e for e in events}.values()
+        with ThreadPoolExecutor(max_workers=POSTER_WORKERS) as pool:
+            list(pool.map(lambda e: self._fetch_poster(e, cell_w, cell_h), unique))
+
+    def _prune_posters(self):
+        limit = datetime.now().timestamp() - POSTER_CACHE_DAYS * 86400
+        for name in os.listdir(POSTER_CACHE_DIR):
+            path = os.path.join(POSTER_CACHE_DIR, name)
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
 
     def _fmt_date(self, d):
         try:
@@ -190,114 +290,128 @@ class ExhibitionUpdater(ImageUpdater):
             y += line_height
         return y
 
+    def _load_fonts(self):
+        if self._fonts is None:
+            self._fonts = (
+                ImageFont.truetype(self.FONT_BOLD_PATH, 17),   # 会場名
+                ImageFont.truetype(self.FONT_REG_PATH,  16),   # タイトル
+                ImageFont.truetype(self.FONT_REG_PATH,  13),   # エリア・休館日
+                ImageFont.truetype(self.FONT_BOLD_PATH, 17),   # 会期
+                ImageFont.truetype(self.FONT_BOLD_PATH, 13),   # バッジ
+            )
+        return self._fonts
+
+    def _cell_key(self, event):
+        """セルの見た目を決めるもの: イベント・ポスター・日付 (バッジが日付で変わる)"""
+        return (event["name"], event["venue"], event["starts"], event["ends"],
+                event["poster"], date.today().toordinal())
+
+    def _render_cell(self, event):
+        """1 件分のセル (CELL_W×CELL_H) を描画する。ポスターを取得できたかも返す。"""
+        f_venue, f_title, f_sub, f_date, f_badge = self._load_fonts()
+        PAD = 16
+
+        # ---- ポスター背景 or カテゴリ背景色 ----
+        poster = self._fetch_poster(event, CELL_W, CELL_H)
+        if poster:
+            # ポスターを暗くして文字を読みやすくする
+            img = poster.point(DARKEN_LUT)
+            text_color   = (255, 255, 255)
+            sub_color    = (220, 215, 210)
+            date_color   = (255, 255, 255)
+            closed_color = (220, 215, 210)
+            stroke_w     = 2
+            stroke_c     = (0, 0, 0)
+        else:
+            img = Image.new("RGB", (CELL_W, CELL_H), color=tuple(event["bg"]))
+            text_color   = (35, 35, 35)
+            sub_color    = (120, 110, 100)
+            date_color   = (100, 90, 80)
+            closed_color = (160, 140, 120)
+            stroke_w     = 0
+            stroke_c     = None
+        draw = ImageDraw.Draw(img)
+
+        venue_name  = event["venue"]
+        event_name  = event["name"]
+        starts      = event["starts"]
+        ends        = event["ends"]
+        area        = event["area"]
+        cat_str     = " / ".join(event["categories"])
+        closed_str  = self._closed_str(event)
+        badge       = self._badge(event)
+        date_str    = f"{self._fmt_date(starts)} – {self._fmt_date(ends)}"
+
+        y = PAD
+
+        # ---- 会場名 ----
+        draw.text((PAD, y), venue_name, font=f_venue, fill=text_color,
+                  stroke_width=stroke_w, stroke_fill=stroke_c)
+        y += 24
+
+        # ---- エリア | カテゴリ ----
+        sub_parts = [p for p in [area, cat_str] if p]
+        sub = "  |  ".join(sub_parts)
+        draw.text((PAD, y), sub, font=f_sub, fill=sub_color,
+                  stroke_width=stroke_w, stroke_fill=stroke_c)
+        y += 20
+
+        # ---- バッジ ----
+        if badge:
+            badge_text, badge_color = badge
+            bw = draw.textlength(badge_text, font=f_badge) + 10
+            draw.rectangle((PAD, y, PAD + bw, y + 18),
+                           fill=badge_color)
+            draw.text((PAD + 5, y + 2), badge_text,
+                      font=f_badge, fill=(255, 255, 255))
+            y += 24
+
+        # ---- 展示タイトル ----
+        max_lines = 3 if badge else 4
+        y = self._draw_wrapped(draw, event_name, f_title,
+                               PAD, y,
+                               max_width=CELL_W - PAD * 2,
+                               fill=text_color,
+                               line_height=22,
+                               max_lines=max_lines,
+                               stroke_width=stroke_w,
+                               stroke_fill=stroke_c)
+
+        # ---- 下部：会期 & 休館日 ----
+        bottom_y = CELL_H - PAD - 20
+        draw.text((PAD, bottom_y), date_str,
+                  font=f_date, fill=date_color,
+                  stroke_width=stroke_w, stroke_fill=stroke_c)
+        if closed_str:
+            cl_w = draw.textlength(closed_str, font=f_sub)
+            draw.text((CELL_W - PAD - cl_w, bottom_y + 4), closed_str,
+                      font=f_sub, fill=closed_color,
+                      stroke_width=stroke_w, stroke_fill=stroke_c)
+
+        return img, poster is not None
+
+    def _cell(self, event):
+        """描画済みのセルがあれば使い回す。ポスターの取得に失敗したセルは次回描き直す。"""
+        key = self._cell_key(event)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell, complete = self._render_cell(event)
+            if complete or not event["poster"]:
+                self._cells[key] = cell
+        return cell
+
     def create_screen(self, four_events):
         """4件の展示会を2×2レイアウトで800×480の画像に描画する。"""
         img = Image.new("RGB", (800, 480), color=(240, 238, 235))
-        draw = ImageDraw.Draw(img)
-
-        f_venue  = ImageFont.truetype(self.FONT_BOLD_PATH, 17)
-        f_title  = ImageFont.truetype(self.FONT_REG_PATH,  16)
-        f_sub    = ImageFont.truetype(self.FONT_REG_PATH,  13)
-        f_date   = ImageFont.truetype(self.FONT_BOLD_PATH, 17)
-        f_badge  = ImageFont.truetype(self.FONT_BOLD_PATH, 13)
 
-        CELL_W, CELL_H = 400, 240
         POSITIONS = [(0, 0), (400, 0), (0, 240), (400, 240)]
         DIVIDER   = (195, 190, 183)
-        PAD       = 16
-
-        for i, event in enumerate(four_events):
-            cx, cy = POSITIONS[i]
-            categories = event.get("categories", [])
-
-            # ---- ポスター背景 or カテゴリ背景色 ----
-            poster = self._fetch_poster(event, CELL_W, CELL_H)
-            if poster:
-                # ポスターを貼り、暗めのオーバーレイをかけて文字を読みやすくする
-                img.paste(poster, (cx, cy))
-                dark = Image.new("RGB", (CELL_W, CELL_H), (0, 0, 0))
-                cell = img.crop((cx, cy, cx + CELL_W, cy + CELL_H))
-                blended = Image.blend(cell, dark, alpha=0.52)
-                img.paste(blended, (cx, cy))
-                draw = ImageDraw.Draw(img)
-                text_color   = (255, 255, 255)
-                sub_color    = (220, 215, 210)
-                date_color   = (255, 255, 255)
-                closed_color = (220, 215, 210)
-                stroke_w     = 2
-                stroke_c     = (0, 0, 0)
-            else:
-                bg = self._bg_color(categories)
-                draw.rectangle((cx, cy, cx + CELL_W - 1, cy + CELL_H - 1), fill=bg)
-                text_color   = (35, 35, 35)
-                sub_color    = (120, 110, 100)
-                date_color   = (100, 90, 80)
-                closed_color = (160, 140, 120)
-                stroke_w     = 0
-                stroke_c     = None
-
-            venue_name  = event.get("venue", {}).get("fields", {}).get("fullName", "")
-            event_name  = event.get("eventName", "")
-            starts      = event.get("scheduleStartsOn", "")
-            ends        = event.get("scheduleEndsOn", "")
-            area        = (event.get("venue", {})
-                               .get("fields", {})
-                               .get("localArea", {})
-                               .get("fields", {})
-                               .get("name", ""))
-            cat_names   = [c.get("fields", {}).get("name", "") for c in categories]
-            cat_str     = " / ".join(cat_names[:2])
-            closed_str  = self._closed_str(event)
-            badge       = self._badge(event)
-            date_str    = f"{self._fmt_date(starts)} – {self._fmt_date(ends)}"
-
-            y = cy + PAD
-
-            # ---- 会場名 ----
-            draw.text((cx + PAD, y), venue_name, font=f_venue, fill=text_color,
-                      stroke_width=stroke_w, stroke_fill=stroke_c)
-            y += 24
 
-            # ---- エリア | カテゴリ ----
-            sub_parts = [p for p in [area, cat_str] if p]
-            sub = "  |  ".join(sub_parts)
-            draw.text((cx + PAD, y), sub, font=f_sub, fill=sub_color,
-                      stroke_width=stroke_w, stroke_fill=stroke_c)
-            y += 20
-
-            # ---- バッジ ----
-            if badge:
-                badge_text, badge_color = badge
-                bw = draw.textlength(badge_text, font=f_badge) + 10
-                draw.rectangle((cx + PAD, y, cx + PAD + bw, y + 18),
-                               fill=badge_color)
-                draw.text((cx + PAD + 5, y + 2), badge_text,
-                          font=f_badge, fill=(255, 255, 255))
-                y += 24
-
-            # ---- 展示タイトル ----
-            max_lines = 3 if badge else 4
-            y = self._draw_wrapped(draw, event_name, f_title,
-                                   cx + PAD, y,
-                                   max_width=CELL_W - PAD * 2,
-                                   fill=text_color,
-                                   line_height=22,
-                                   max_lines=max_lines,
-                                   stroke_width=stroke_w,
-                                   stroke_fill=stroke_c)
-
-            # ---- 下部：会期 & 休館日 ----
-            bottom_y = cy + CELL_H - PAD - 20
-            draw.text((cx + PAD, bottom_y), date_str,
-                      font=f_date, fill=date_color,
-                      stroke_width=stroke_w, stroke_fill=stroke_c)
-            if closed_str:
-                cl_w = draw.textlength(closed_str, font=f_sub)
-                draw.text((cx + CELL_W - PAD - cl_w, bottom_y + 4), closed_str,
-                          font=f_sub, fill=closed_color,
-                          stroke_width=stroke_w, stroke_fill=stroke_c)
+        for (cx, cy), event in zip(POSITIONS, four_events):
+            img.paste(self._cell(event), (cx, cy))
 
         # ---- 区切り線 ----
+        draw = ImageDraw.Draw(img)
         draw.line([(400, 0), (400, 480)], fill=DIVIDER, width=1)
         draw.line([(0, 240), (800, 240)], fill=DIVIDER, width=1)
 
@@ -305,8 +419,8 @@ class ExhibitionUpdater(ImageUpdater):
 
     def update(self):
         try:
-            events  = self.fetch_events()
-            active  = self.get_active_events(events)
+            store   = self.fetch_events()
+            active  = self.get_active_events(store)
             print(f"ExhibitionUpdater: 本日開催中 {len(active)} 件")
 
             if len(active) == 0:
@@ -317,6 +431,10 @@ class ExhibitionUpdater(ImageUpdater):
                 active = active + random.choices(active, k=12 - len(active))
 
             selected = random.sample(active, 12)
+            today = date.today().toordinal()
+            self._cells = {k: v for k, v in self._cells.items() if k[-1] == today}
+            self._posters = {}
+            self.prefetch_posters([e for e in selected if self._cell_key(e) not in self._cells])
 
             imgs = [
                 self.create_screen(selected[0:4]),
@@ -324,6 +442,7 @@ class ExhibitionUpdater(ImageUpdater):
                 self.create_screen(selected[8:12]),
             ]
             self.image_request(imgs)
+            self._prune_posters()
         except Exception as e:
             print(f"ExhibitionUpdater Error: {e}")
 
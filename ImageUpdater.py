@@ -1,11 +1,26 @@
 import requests
 import io
 import functools
+import threading
+import time
 from PIL import Image
 from tqdm.contrib.concurrent import thread_map
 
+# epaper.py が 1 つの Updater に割り当てる時間 (秒)。次の Updater はこの後に動く
+UPDATE_SLOT = 15 * 60
+# ディスプレイが書き換えを受け付ける最短間隔 (display.py の MIN_REFRESH_INTERVAL + 余裕)。
+# ディスプレイ側は書き換えが終わった時刻から数える
+MIN_REFRESH_INTERVAL = 5 * 60 + 5
+
 class ImageUpdater():
 
+    # 各ディスプレイに最後に表示させた画面の識別子 (全 Updater で共有)
+    _displayed: dict[str, object] = {}
+    # schedule_frames で予約された未送信のフレーム (全 Updater で共有)
+    _scheduled: list[threading.Timer] = []
+    _schedule_generation = 0   # cancel_frames のたびに進め、それ以前の予約を無効にする
+    _schedule_lock = threading.Lock()
+
     def __init__(self):
         self.urls = [
             "http://display1.raspi.rikuta:8000/display",
@@ -13,6 +28,10 @@ class ImageUpdater():
             "http://display3.raspi.rikuta:8000/display",
         ]
 
+    def displayed_token(self, url: str):
+        """url のディスプレイに現在表示されている画面の識別子 (不明なら None)"""
+        return ImageUpdater._displayed.get(url)
+
     def __send_image(self, image: Image.Image, url: str, session=None):
         buf = io.BytesIO()
         image.save(buf, format="PNG")
@@ -22,15 +41,89 @@ class ImageUpdater():
         params= {"force": False}
         try:
             resp = session.post(url, params=params,files=files, timeout=60)
+            if resp.status_code == 429:
+                # 最短更新間隔内: 表示は変わっていない。何秒後に送れるかを返す
+                return url, 429, resp.headers.get("Retry-After", "")
             resp.raise_for_status()
             return url, resp.status_code, resp.text
         except Exception as e:
             return url, None, str(e)
 
-    def image_request(self, images):
+    def image_request(self, images, tokens=None):
+        """images[i] を self.urls[i] に送信する。None のディスプレイは更新しない。
+        tokens[i] は送信に成功したときにそのディスプレイの識別子として記録される。
+        予約済みのフレームは (どの Updater のものでも) 取り消す。"""
+        ImageUpdater.cancel_frames()
+        return self._post_images(images, tokens)
+
+    def schedule_frames(self, frames):
+        """frames: [(表示時刻 (epoch 秒), images, tokens), ...] を順に送信するよう予約する。
+        各フレームは表示時刻になり、かつ前のフレームでディスプレイを書き換えてから
+        MIN_REFRESH_INTERVAL たってから送る。送信時に表示中の画面と tokens が同じディスプレイは送らず、
+        429 が返ったディスプレイは Retry-After の後に送り直す。
+        次に image_request が呼ばれた時点で未送信のものは取り消される。"""
+        frames = sorted(frames, key=lambda frame: frame[0])
+        if frames:
+            with ImageUpdater._schedule_lock:
+                generation = ImageUpdater._schedule_generation
+            self._arm_frame(generation, frames[0][0], frames)
+
+    @staticmethod
+    def cancel_frames():
+        with ImageUpdater._schedule_lock:
+            ImageUpdater._schedule_generation += 1
+            for timer in ImageUpdater._scheduled:
+                timer.cancel()
+            ImageUpdater._scheduled.clear()
+
+    def _arm_frame(self, generation, at, frames):
+        with ImageUpdater._schedule_lock:
+            if generation != ImageUpdater._schedule_generation:
+                return
+            timer = threading.Timer(max(0.0, at - time.time()),
+                                    self._post_frame, (generation, frames))
+            timer.daemon = True
+            ImageUpdater._scheduled.append(timer)
+            timer.start()
+
+    def _post_frame(self, generation, frames):
+        with ImageUpdater._schedule_lock:
+            ImageUpdater._scheduled = [t for t in ImageUpdater._scheduled
+                                       if t is not threading.current_thread()]
+            if generation != ImageUpdater._schedule_generation:
+                return
+        _, images, tokens = frames[0]
+        rest = frames[1:]
+        tokens = tokens or [None] * len(images)
+        # 表示中の画面と同じものは送らない (前のフレームが届かなかった画面はここで送り直される)
+        images = [None if token is not None and self.displayed_token(url) == token else img
+                  for img, url, token in zip(images, self.urls, tokens)]
+        results = self._post_images(images, tokens)
+
+        now = time.time()
+        earliest = now
+        if any(status is not None and status < 400 for _, status, _ in results):
+            earliest = now + MIN_REFRESH_INTERVAL
+        busy = {url: int(wait) if str(wait).isdigit() else MIN_REFRESH_INTERVAL
+                for url, status, wait in results if status == 429}
+        if busy:
+            retry_at = now + max(busy.values()) + 1
+            earliest = max(earliest, retry_at)
+            # 次のフレームがそれより前なら送り直しは不要 (次のフレームを retry_at まで待たせる)
+            if not rest or retry_at < rest[0][0]:
+                retry = [img if url in busy else None for img, url in zip(images, self.urls)]
+                rest = [(retry_at, retry, tokens)] + rest
+            print(f"[{type(self).__name__}] 429: {len(busy)} 画面を {retry_at - now:.0f} 秒後に送り直す")
+        if rest:
+            self._arm_frame(generation, max(rest[0][0], earliest), rest)
+
+    def _post_images(self, images, tokens=None):
         assert len(images) == len(self.urls)
+        tokens = tokens or [None] * len(images)
+        tasks = [(img, url) for img, url in zip(images, self.urls) if img is not None]
+        if not tasks:
+            return []
         with requests.Session() as session:
-            tasks = list(zip(images, self.urls))
             bound = functools.partial(self.__send_image, session=session)
             results = thread_map(
                 lambda args: bound(*args),  # (image, url) を展開
@@ -39,6 +132,11 @@ class ImageUpdater():
                 chunksize=1,
                 desc="Uploading images"
             )
+        token_of = dict(zip(self.urls, tokens))
+        for url, status, _ in results:
+            if status == 429:
+                continue   # 書き換えられていないので表示中の画面は変わらない
+            ImageUpdater._displayed[url] = token_of[url] if status is not None else None
         return results
     
     def update(self):
@@ -8,14 +8,19 @@ danielqsj/kafka-exporter が Prometheus に公開するメトリクスを使用
             CG ヘッダー行: ラグ + Δ10m + 1時間スパークライン
             トピック行   : ラグ + Δ10m
   画面3 — CG × トピック別ラグ詳細・2列 (2/2)
+
+CG はラグ降順 (同じラグなら CG 名順) に並べ、直前に表示した CG の次から page_size 件を topk で、
+各 CG のトピックは上位 topics_per_group 件だけの詳細を取得する。
+rotate=True では画面2・3 に収まった CG の次からカーソルを進め、全 CG を巡回する。
+各ページは page_ttl を過ぎるまでキャッシュを再利用する。
 """
 
 from PIL import Image, ImageDraw
 from PrometheusBase import (
-    PrometheusBase,
+    PrometheusBase, PROMETHEUS_URL,
     COLOR_BG, COLOR_FG, COLOR_SUB, COLOR_OK, COLOR_WARN, COLOR_CRIT,
     COLOR_NEUTRAL, COLOR_BORDER,
-    FONT_REG, FONT_BOLD, _load_font,
+    FONT_REG, FONT_BOLD, _load_font, _label_regex,
 )
 
 
@@ -38,6 +43,15 @@ LAG_X   = 242  # ラグ値
 DELTA_X = 297  # Δ値
 NAME_MAX = 30  # 名前の最大文字数
 
+# 取得件数
+TOPIC_ROWS    = (456 - 102) // 20                  # 画面1 のトピック行数
+TOPICS_PER_CG = (MAX_COL_H - CG_H) // TOPIC_H      # 1 列に収まる CG あたりトピック数
+CG_PAGE_SIZE  = 16                                 # 画面2・3 に載せる CG 数
+
+# {match} には _query_ranked が consumergroup のマッチャを差し込む
+CG_LAG       = 'sum by (consumergroup)(kafka_consumergroup_lag{{consumergroup!=""{match}}})'
+CG_TOPIC_LAG = "sum by (consumergroup, topic)(kafka_consumergroup_lag{sel})"
+
 
 def _lag_color(lag: float):
     if lag == 0:
@@ -66,66 +80,146 @@ def _fmt_delta(delta: float | None) -> tuple[str, tuple]:
     return "—", COLOR_SUB
 
 
+def _spark_points(values: list[float], w: int, h: int) -> tuple:
+    """CG ラグ 1 時間スパークラインの描画点 (左上基準の相対 px, 縦軸 min〜max)"""
+    if not values or len(values) < 2:
+        return ()
+    lo, hi = min(values), max(values)
+    if hi == lo:
+        return ((0, h // 2), (w, h // 2))
+    return tuple(
+        (int(i * w / (len(values) - 1)), h - int((v - lo) / (hi - lo) * h))
+        for i, v in enumerate(values)
+    )
+
+
+def _range_label(start: int, n: int, total: int) -> str:
+    """"CG 1–8/120" 形式 (順位は 1 始まり)"""
+    if n == 0:
+        return f"CG —/{total}"
+    return f"CG {start + 1}–{start + n}/{total}"
+
+
 class KafkaUpdater(PrometheusBase):
 
+    def __init__(self, prom_url: str = PROMETHEUS_URL, page_size: int = CG_PAGE_SIZE,
+                 page_offset: int = 0, topics_per_group: int = TOPICS_PER_CG,
+                 rotate: bool = False):
+        """page_size: 取得する CG 数, page_offset: 先頭 CG のラグ順位 (0 始まり)
+        rotate: True なら page_offset を起点に更新ごとに次の CG へ進む"""
+        super().__init__(prom_url)
+        self.page_size        = page_size
+        self.page_offset      = page_offset
+        self.topics_per_group = min(topics_per_group, TOPICS_PER_CG)
+        self.rotate           = rotate
+        self._cursor          = page_offset
+        self._after           = None   # rotate 時、_cursor 件目の直前の CG の (lag, CG)
+
     # ── Prometheus クエリ ─────────────────────────────────────────────────────
 
     def _collect_kafka_metrics(self) -> dict:
         m = {}
         m["brokers"]           = self._query_scalar("kafka_brokers")
-        m["topic_parts"]       = self._query("kafka_topic_partitions", key="topic")
-        m["topic_urp"]         = self._query(
-            "sum by (topic)(kafka_topic_partition_under_replicated_partition)", key="topic"
-        )
+        m["n_topics"]          = self._query_scalar("count(kafka_topic_partitions)")
+        m["total_parts"]       = self._query_scalar("sum(kafka_topic_partitions)")
         m["total_urp"]         = self._query_scalar(
             "sum(kafka_topic_partition_under_replicated_partition)"
         )
-        m["cg_lag"]            = self._query(
-            "sum by (consumergroup)(kafka_consumergroup_lag)", key="consumergroup"
-        )
+        m["topic_urp"]         = dict(self._query_ranked(
+            # URP のあるトピックだけを並べる (0 の健全なトピックを topk に拾わせない)
+            'sum by (topic)(kafka_topic_partition_under_replicated_partition{{topic!=""{match}}}) > 0',
+            limit=TOPIC_ROWS, key="topic",
+        ))
+        m["topic_parts"]       = self._query(
+            f'kafka_topic_partitions{{topic=~"{_label_regex(m["topic_urp"])}"}}', key="topic"
+        ) if m["topic_urp"] else {}
+        m["n_cgs"]             = self._query_scalar(f"count({CG_LAG.format(match='')})")
+        return m
+
+    def _collect_cg_page(self, after: tuple | None) -> dict:
+        """after = (lag, CG) の次から page_size 件の CG とその詳細"""
+        m = {}
+        m["cg_lag"]            = dict(self._query_ranked(
+            CG_LAG, limit=self.page_size, after=after, key="consumergroup",
+        ))
+        m.update(self._collect_cg_details(list(m["cg_lag"])))
+        return m
+
+    def _cg_page(self, after: tuple | None) -> dict:
+        return self._cached_page(("cg", after), lambda: self._collect_cg_page(after))
+
+    def _collect_cg_details(self, cgs: list[str]) -> dict:
+        """指定 CG のみの Δ10m / 履歴 / トピック別ラグ (CG ごとに上位 topics_per_group 件)"""
+        if not cgs:
+            return {"cg_lag_delta": {}, "cg_lag_history": {},
+                    "cg_topic_lag": {}, "cg_topic_lag_delta": {}}
+        sel = f'{{consumergroup=~"{_label_regex(cgs)}"}}'
+        m = {}
         m["cg_lag_delta"]      = self._query(
-            "sum by (consumergroup)(kafka_consumergroup_lag)"
-            " - sum by (consumergroup)(kafka_consumergroup_lag offset 10m)",
+            f"sum by (consumergroup)(kafka_consumergroup_lag{sel})"
+            f" - sum by (consumergroup)(kafka_consumergroup_lag{sel} offset 10m)",
             key="consumergroup",
         )
         m["cg_lag_history"]    = self._query_range(
-            "sum by (consumergroup)(kafka_consumergroup_lag)",
+            f"sum by (consumergroup)(kafka_consumergroup_lag{sel})",
             duration_s=3600, step=120, key="consumergroup",
         )
         m["cg_topic_lag"]      = self._query_multi(
-            "sum by (consumergroup, topic)(kafka_consumergroup_lag)",
+            f"topk by (consumergroup) ({self.topics_per_group}, "
+            f"{CG_TOPIC_LAG.format(sel=sel)})",
             ["consumergroup", "topic"],
         )
+        topics = sorted({t for _, t in m["cg_topic_lag"]})
+        if not topics:
+            m["cg_topic_lag_delta"] = {}
+            return m
+        sel_t = f'{{consumergroup=~"{_label_regex(cgs)}", topic=~"{_label_regex(topics)}"}}'
         m["cg_topic_lag_delta"] = self._query_multi(
-            "sum by (consumergroup, topic)(kafka_consumergroup_lag)"
-            " - sum by (consumergroup, topic)(kafka_consumergroup_lag offset 10m)",
+            f"{CG_TOPIC_LAG.format(sel=sel_t)}"
+            f" - sum by (consumergroup, topic)(kafka_consumergroup_lag{sel_t} offset 10m)",
             ["consumergroup", "topic"],
         )
         return m
 
+    # ── CG → トピック索引 (lag / Δ10m / 履歴を 1 パスで結合) ──────────────────
+
+    def _index_groups(self, m: dict) -> dict[str, dict]:
+        """{cg: {"lag", "delta", "history", "topics": [(topic, lag, delta), ...]}}
+        CG はラグ降順 (cg_lag の順)、トピックはラグ降順"""
+        index = {
+            cg: {
+                "lag":     lag,
+                "delta":   m["cg_lag_delta"].get(cg),
+                "history": m["cg_lag_history"].get(cg, []),
+                "topics":  [],
+            }
+            for cg, lag in m["cg_lag"].items()
+        }
+        topic_delta = m["cg_topic_lag_delta"]
+        for key, lag in m["cg_topic_lag"].items():
+            entry = index.get(key[0])
+            if entry is not None:
+                entry["topics"].append((key[1], lag, topic_delta.get(key)))
+        for entry in index.values():
+            entry["topics"].sort(key=lambda x: -x[1])
+        return index
+
     # ── 列パッキング (高さベース、グループをまたがない) ───────────────────────
 
     def _build_columns(self, m: dict) -> list[list[tuple]]:
         groups = []
-        for cg, total_lag in sorted(m["cg_lag"].items(), key=lambda x: x[0]):
-            delta_cg = m["cg_lag_delta"].get(cg)
-            hist_cg  = m["cg_lag_history"].get(cg, [])
-            group = [("cg", cg, total_lag, delta_cg, hist_cg)]
-            for topic, lag in sorted(
-                [(t, l) for (g, t), l in m["cg_topic_lag"].items() if g == cg],
-                key=lambda x: -x[1],
-            ):
-                delta_t = m["cg_topic_lag_delta"].get((cg, topic))
-                group.append(("topic", topic, lag, delta_t, None))
-            groups.append(group)
+        for cg, entry in self._index_groups(m).items():
+            group = [("cg", cg, entry["lag"], entry["delta"], entry["history"])]
+            group.extend(("topic", topic, lag, delta, None)
+                         for topic, lag, delta in entry["topics"])
+            groups.append((CG_H + TOPIC_H * len(entry["topics"]), group))
 
         columns: list[list[tuple]] = []
         current: list[tuple] = []
         cur_h = 0
 
-        for group in groups:
+        for grp_h, group in groups:
             sep_h = SEP_H if current else 0
-            grp_h = sum(ROW_HEIGHT[r[0]] for r in group)
             if cur_h + sep_h + grp_h > MAX_COL_H:
                 columns.append(current)
                 current = []
@@ -141,9 +235,50 @@ class KafkaUpdater(PrometheusBase):
             columns.append(current)
         return columns
 
+    # ── view-model (表示文字列・色・座標に整形済み) ────────────────────────────
+
+    def _vm_cluster(self, m: dict) -> tuple:
+        brokers     = int(m["brokers"] or 0)
+        n_topics    = int(m["n_topics"] or 0)
+        total_parts = int(m["total_parts"] or 0)
+        total_urp   = int(m["total_urp"] or 0)
+        n_cgs       = int(m["n_cgs"] or 0)
+
+        stats = (
+            ("Brokers",     f"{brokers}",    COLOR_OK if brokers > 0 else COLOR_CRIT),
+            ("Topics",      str(n_topics),   COLOR_FG),
+            ("Partitions",  str(total_parts), COLOR_FG),
+            ("URP",         str(total_urp),  COLOR_OK if total_urp == 0 else COLOR_CRIT),
+            ("Con. Groups", str(n_cgs),      COLOR_FG),
+        )
+        topics_sorted = sorted(
+            m["topic_parts"].items(),
+            key=lambda x: (-m["topic_urp"].get(x[0], 0), x[0]),
+        )
+        topics = []
+        for topic, parts in topics_sorted[:TOPIC_ROWS]:
+            urp = int(m["topic_urp"].get(topic, 0))
+            topics.append((topic[:65], str(int(parts)), str(urp),
+                           COLOR_CRIT if urp > 0 else COLOR_FG))
+        return stats, tuple(topics)
+
+    def _vm_cg_detail(self, left_col: list, right_col: list, page: str) -> tuple:
+        cols = []
+        for col_data in (left_col, right_col):
+            rows = []
+            for kind, name, lag, delta, history in col_data:
+                if kind == "sep":
+                    rows.append((kind,))
+                    continue
+                spark = _spark_points(history, COL_W - 16, CG_H - 22) if kind == "cg" else None
+                rows.append((kind, name[:NAME_MAX], _fmt_lag(lag), _lag_color(lag),
+                             *_fmt_delta(delta), spark))
+            cols.append(tuple(rows))
+        return page, tuple(cols)
+
     # ── 画面1: クラスタ概要 ───────────────────────────────────────────────────
 
-    def _screen_cluster_health(self, m: dict) -> Image.Image:
+    def _screen_cluster_health(self, vm: tuple) -> Image.Image:
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         draw   = ImageDraw.Draw(canvas)
 
@@ -156,19 +291,7 @@ class KafkaUpdater(PrometheusBase):
         draw.text((8, 6), "Kafka Cluster", font=f_title, fill=COLOR_FG)
         draw.line([(0, 26), (800, 26)], fill=COLOR_BORDER, width=1)
 
-        brokers     = int(m["brokers"] or 0)
-        n_topics    = len(m["topic_parts"])
-        total_parts = int(sum(m["topic_parts"].values()))
-        total_urp   = int(m["total_urp"] or 0)
-        n_cgs       = len(m["cg_lag"])
-
-        stats = [
-            ("Brokers",     f"{brokers}",    COLOR_OK if brokers > 0 else COLOR_CRIT),
-            ("Topics",      str(n_topics),   COLOR_FG),
-            ("Partitions",  str(total_parts), COLOR_FG),
-            ("URP",         str(total_urp),  COLOR_OK if total_urp == 0 else COLOR_CRIT),
-            ("Con. Groups", str(n_cgs),      COLOR_FG),
-        ]
+        stats, topics = vm
         stat_w = 155
         for i, (label, value, color) in enumerate(stats):
             sx = 8 + i * stat_w
@@ -183,18 +306,11 @@ class KafkaUpdater(PrometheusBase):
 
         row_h   = 20
         start_y = 102
-        max_rows = (456 - start_y) // row_h
-        topics_sorted = sorted(
-            m["topic_parts"].items(),
-            key=lambda x: (-m["topic_urp"].get(x[0], 0), x[0]),
-        )
-        for idx, (topic, parts) in enumerate(topics_sorted[:max_rows]):
-            y   = start_y + idx * row_h
-            urp = int(m["topic_urp"].get(topic, 0))
-            draw.text((8,   y), topic[:65],      font=f_body, fill=COLOR_FG)
-            draw.text((530, y), str(int(parts)), font=f_body, fill=COLOR_FG)
-            draw.text((660, y), str(urp),        font=f_body,
-                      fill=COLOR_CRIT if urp > 0 else COLOR_FG)
+        for idx, (topic, parts, urp, urp_color) in enumerate(topics):
+            y = start_y + idx * row_h
+            draw.text((8,   y), topic, font=f_body, fill=COLOR_FG)
+            draw.text((530, y), parts, font=f_body, fill=COLOR_FG)
+            draw.text((660, y), urp,   font=f_body, fill=urp_color)
             draw.line([(0, y + row_h - 1), (800, y + row_h - 1)],
                       fill=(230, 230, 230), width=1)
 
@@ -203,26 +319,12 @@ class KafkaUpdater(PrometheusBase):
 
     # ── 画面2・3: CG × トピック別ラグ詳細・2列 ──────────────────────────────
 
-    def _draw_sparkline(self, draw, x, y, w, h, values):
-        if not values or len(values) < 2:
-            return
-        lo, hi = min(values), max(values)
-        if hi == lo:
-            mid = y + h // 2
-            draw.line([(x, mid), (x + w, mid)], fill=COLOR_NEUTRAL, width=1)
+    def _draw_sparkline(self, draw, x, y, points):
+        if len(points) < 2:
             return
-        def pt(i, v):
-            px = x + int(i * w / (len(values) - 1))
-            py = y + h - int((v - lo) / (hi - lo) * h)
-            return px, py
-        prev = None
-        for i, v in enumerate(values):
-            cur = pt(i, v)
-            if prev:
-                draw.line([prev, cur], fill=COLOR_NEUTRAL, width=1)
-            prev = cur
-
-    def _screen_cg_lag_detail(self, left_col: list, right_col: list, page: str) -> Image.Image:
+        draw.line([(x + px, y + py) for px, py in points], fill=COLOR_NEUTRAL, width=1)
+
+    def _screen_cg_lag_detail(self, vm: tuple) -> Image.Image:
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         draw   = ImageDraw.Draw(canvas)
 
@@ -232,6 +334,7 @@ class KafkaUpdater(PrometheusBase):
         f_body  = _load_font(FONT_REG,  11)
         f_val   = _load_font(FONT_BOLD, 11)
 
+        page, cols = vm
         draw.text((8, 6), f"CG Lag by Topic  ({page})", font=f_title, fill=COLOR_FG)
         draw.line([(0, 26), (800, 26)], fill=COLOR_BORDER, width=1)
 
@@ -244,37 +347,34 @@ class KafkaUpdater(PrometheusBase):
         draw.line([(0, 44), (800, 44)], fill=COLOR_BORDER, width=1)
         draw.line([(COL_W, 26), (COL_W, 479)], fill=COLOR_BORDER, width=1)
 
-        for col_idx, col_data in enumerate([left_col, right_col]):
+        for col_idx, col_data in enumerate(cols):
             cx = col_idx * COL_W
             y  = ROW_START_Y
 
-            for kind, name, lag, delta, history in col_data:
-                h     = ROW_HEIGHT[kind]
-                color = _lag_color(lag)
+            for row in col_data:
+                kind = row[0]
+                h    = ROW_HEIGHT[kind]
 
                 if kind == "sep":
                     y += h
                     continue
 
+                _, name, lag_str, color, delta_str, delta_color, spark = row
                 if kind == "cg":
                     draw.rectangle((cx, y, cx + COL_W - 1, y + h - 1), fill=(245, 245, 250))
                     draw.ellipse((cx + 8, y + 4, cx + 16, y + 12), fill=color)
-                    draw.text((cx + 20,    y + 2), name[:NAME_MAX], font=f_cg,  fill=COLOR_FG)
-                    draw.text((cx + LAG_X, y + 2), _fmt_lag(lag),   font=f_val, fill=color)
-                    delta_str, delta_color = _fmt_delta(delta)
+                    draw.text((cx + 20,    y + 2), name,    font=f_cg,  fill=COLOR_FG)
+                    draw.text((cx + LAG_X, y + 2), lag_str, font=f_val, fill=color)
                     draw.text((cx + DELTA_X, y + 2), delta_str, font=f_val, fill=delta_color)
                     # スパークライン (下半分)
                     spark_y = y + 18
                     spark_h = h - 22  # 14px
                     draw.rectangle((cx + 8, spark_y, cx + COL_W - 8, spark_y + spark_h),
                                    fill=(240, 244, 255))
-                    if history:
-                        self._draw_sparkline(draw, cx + 8, spark_y,
-                                             COL_W - 16, spark_h, history)
+                    self._draw_sparkline(draw, cx + 8, spark_y, spark)
                 else:
-                    draw.text((cx + 24,    y + 2), name[:NAME_MAX], font=f_body, fill=COLOR_SUB)
-                    draw.text((cx + LAG_X, y + 2), _fmt_lag(lag),   font=f_body, fill=color)
-                    delta_str, delta_color = _fmt_delta(delta)
+                    draw.text((cx + 24,    y + 2), name,    font=f_body, fill=COLOR_SUB)
+                    draw.text((cx + LAG_X, y + 2), lag_str, font=f_body, fill=color)
                     draw.text((cx + DELTA_X, y + 2), delta_str, font=f_body, fill=delta_color)
 
                 draw.line([(cx, y + h - 1), (cx + COL_W - 1, y + h - 1)],
@@ -288,16 +388,39 @@ class KafkaUpdater(PrometheusBase):
 
     def update(self):
         print("[KafkaUpdater] メトリクス取得中...")
-        m    = self._collect_kafka_metrics()
-        cols = self._build_columns(m)
+        m     = self._collect_kafka_metrics()
+        total = int(m["n_cgs"] or 0)
+
+        offset = self._cursor if self.rotate else self.page_offset
+        after  = self._after if self.rotate else None
+        if offset >= total:
+            offset, after = 0, None
+        if offset and after is None:
+            after = self._seek_ranked(CG_LAG, offset, self.page_size, key="consumergroup")
+        page = self._cg_page(after) if total else {"cg_lag": {}}
+        cols = self._build_columns(page) if total else []
 
         def col(i): return cols[i] if i < len(cols) else []
-
-        img1 = self._screen_cluster_health(m)
-        img2 = self._screen_cg_lag_detail(col(0), col(1), "1/2")
-        img3 = self._screen_cg_lag_detail(col(2), col(3), "2/2")
-
-        self.image_request([img1, img2, img3])
+        def n_cg(*cs): return sum(1 for c in cs for r in c if r[0] == "cg")
+
+        n_left  = n_cg(col(0), col(1))
+        n_right = n_cg(col(2), col(3))
+
+        # 画面に収まらなかった CG は次回の先頭になる
+        if self.rotate:
+            shown = list(page["cg_lag"].items())[:max(n_left + n_right, 1)]
+            self._cursor = offset + max(len(shown), 1)
+            self._after  = (shown[-1][1], shown[-1][0]) if shown else None
+            if self._cursor >= total:
+                self._cursor, self._after = 0, None
+
+        self._push_screens([
+            (self._vm_cluster(m), self._screen_cluster_health),
+            (self._vm_cg_detail(col(0), col(1), _range_label(offset, n_left, total)),
+             self._screen_cg_lag_detail),
+            (self._vm_cg_detail(col(2), col(3), _range_label(offset + n_left, n_right, total)),
+             self._screen_cg_lag_detail),
+        ])
 
 
 if __name__ == "__main__":
@@ -28,6 +28,11 @@ PROXMOX_INSTANCES = [
     "proxmox4.cloud.rikuta:9100",
 ]
 
+# ヘルス一覧の行レイアウト
+HEALTH_ROW_H   = 26
+HEALTH_START_Y = 48
+HEALTH_ROWS    = (480 - HEALTH_START_Y) // HEALTH_ROW_H  # 16行/列
+
 
 def _bar_color(pct: float):
     if pct < 60:
@@ -45,6 +50,23 @@ def _fmt_bytes(bps: float) -> str:
     return f"{bps:.0f}B/s"
 
 
+def _bar_fill(w: int, pct: float) -> int:
+    """使用率バーの塗りつぶし幅 (px)"""
+    return int(w * min(max(pct, 0), 100) / 100)
+
+
+def _spark_points(values: list[float], w: int, h: int) -> tuple:
+    """MEM スパークラインの描画点 (左上基準の相対 px, 縦軸 0〜max(最大値, 10))"""
+    if not values or len(values) < 2:
+        return ()
+    lo, hi = 0, max(max(values), 10)
+    step = w / (len(values) - 1)
+    return tuple(
+        (int(i * step), h - int((v - lo) / (hi - lo) * h))
+        for i, v in enumerate(values)
+    )
+
+
 def _short_host(instance: str) -> str:
     host = instance.split(":")[0]
     for suffix in [".cloud.rikuta", ".server.rikuta", ".raspi.rikuta", ".kafka.server.rikuta"]:
@@ -84,30 +106,78 @@ class NodeUpdater(PrometheusBase):
         )
         return m
 
+    # ── view-model (表示文字列・色・座標に整形済み) ────────────────────────────
+
+    def _vm_card(self, instance: str, m: dict) -> tuple:
+        up   = m["up"].get(instance, 0)
+        temp = m["temp"].get(instance)
+        temp_vm = None
+        if temp is not None:
+            tc = COLOR_CRIT if temp >= 75 else (COLOR_WARN if temp >= 60 else COLOR_SUB)
+            temp_vm = (f"{temp:.0f}°C", tc)
+        head = (_short_host(instance), COLOR_OK if up else COLOR_CRIT, temp_vm)
+        if not up:
+            return head, None
+
+        bars = []
+        for label, key in [("CPU", "cpu"), ("MEM", "mem"), ("Disk", "disk")]:
+            pct = m[key].get(instance, 0)
+            bars.append((label, _bar_fill(290, pct), _bar_color(pct), f"{pct:4.1f}%"))
+
+        l1  = m["load1"].get(instance,  0)
+        l5  = m["load5"].get(instance,  0)
+        l15 = m["load15"].get(instance, 0)
+        rx  = m["net_rx"].get(instance, 0)
+        tx  = m["net_tx"].get(instance, 0)
+        body = (
+            tuple(bars),
+            f"{l1:.2f}  {l5:.2f}  {l15:.2f}",
+            f"↓{_fmt_bytes(rx)}  ↑{_fmt_bytes(tx)}",
+            _spark_points(m["mem_history"].get(instance, []), 384, 74),
+        )
+        return head, body
+
+    def _vm_nodes(self, instances: list[str], m: dict, title: str) -> tuple:
+        return title, tuple(self._vm_card(inst, m) for inst in instances[:4])
+
+    def _vm_health(self, m: dict) -> tuple:
+        all_inst = sorted(
+            m["up"].keys(),
+            key=lambda i: (0 if m["up"].get(i, 0) < 1 else 1, _short_host(i))
+        )
+        rows = []
+        for inst in all_inst[:HEALTH_ROWS * 2]:
+            up   = m["up"].get(inst, 0)
+            host = _short_host(inst)[:16]
+            if not up:
+                rows.append((host, COLOR_CRIT, COLOR_CRIT, None))
+                continue
+            cells = []
+            for key, x, fmt, color_fn in [
+                ("cpu",   130, "{:4.0f}%", _bar_color),
+                ("mem",   190, "{:4.0f}%", _bar_color),
+                ("disk",  250, "{:4.0f}%", _bar_color),
+                ("load1", 310, "{:.2f}",   lambda _: COLOR_FG),
+            ]:
+                v = m[key].get(inst)
+                if v is not None:
+                    cells.append((x, fmt.format(v), color_fn(v)))
+            rows.append((host, COLOR_OK if up >= 1 else COLOR_CRIT, COLOR_FG, tuple(cells)))
+        return tuple(rows)
+
     # ── ノードカード描画 (400×240) ────────────────────────────────────────────
 
-    def _draw_bar(self, draw, x, y, w, h, pct, color):
+    def _draw_bar(self, draw, x, y, w, h, fill_w, color):
         draw.rectangle((x, y, x + w, y + h), outline=COLOR_BORDER, width=1)
-        fill_w = int(w * min(max(pct, 0), 100) / 100)
         if fill_w > 2:
             draw.rectangle((x + 1, y + 1, x + fill_w - 1, y + h - 1), fill=color)
 
-    def _draw_sparkline(self, draw, x, y, w, h, values):
-        if not values or len(values) < 2:
+    def _draw_sparkline(self, draw, x, y, points):
+        if len(points) < 2:
             return
-        lo, hi = 0, max(max(values), 10)
-        def pt(i, v):
-            px = x + int(i * (w / (len(values) - 1)))
-            py = y + h - int((v - lo) / (hi - lo) * h)
-            return px, py
-        prev = None
-        for i, v in enumerate(values):
-            cur = pt(i, v)
-            if prev:
-                draw.line([prev, cur], fill=COLOR_NEUTRAL, width=1)
-            prev = cur
-
-    def _node_card(self, instance: str, m: dict) -> Image.Image:
+        draw.line([(x + px, y + py) for px, py in points], fill=COLOR_NEUTRAL, width=1)
+
+    def _node_card(self, vm: tuple) -> Image.Image:
         img  = Image.new("RGB", (400, 240), COLOR_BG)
         draw = ImageDraw.Draw(img)
 
@@ -118,77 +188,55 @@ class NodeUpdater(PrometheusBase):
 
         draw.rectangle((0, 0, 399, 239), outline=COLOR_BORDER, width=1)
 
-        up = m["up"].get(instance, 0)
-
-        host = _short_host(instance)
-        status_color = COLOR_OK if up else COLOR_CRIT
+        (host, status_color, temp), body = vm
         draw.ellipse((8, 8, 18, 18), fill=status_color)
         draw.text((24, 5), host, font=f_host, fill=COLOR_FG)
 
-        temp = m["temp"].get(instance)
         if temp is not None:
-            tc = COLOR_CRIT if temp >= 75 else (COLOR_WARN if temp >= 60 else COLOR_SUB)
-            draw.text((310, 6), f"{temp:.0f}°C", font=f_val, fill=tc)
+            draw.text((310, 6), temp[0], font=f_val, fill=temp[1])
 
         draw.line([(8, 24), (392, 24)], fill=COLOR_BORDER, width=1)
 
-        if not up:
+        if body is None:
             draw.text((160, 100), "DOWN", font=_load_font(FONT_BOLD, 36), fill=COLOR_CRIT)
             return img
 
-        cpu = m["cpu"].get(instance, 0)
-        y = 32
-        draw.text((8, y), "CPU", font=f_lbl, fill=COLOR_SUB)
-        self._draw_bar(draw, 50, y + 2, 290, 14, cpu, _bar_color(cpu))
-        draw.text((348, y), f"{cpu:4.1f}%", font=f_val, fill=COLOR_FG)
+        bars, load, net, spark = body
+        for i, (label, fill_w, color, value) in enumerate(bars):
+            y = 32 + i * 22
+            draw.text((8, y), label, font=f_lbl, fill=COLOR_SUB)
+            self._draw_bar(draw, 50, y + 2, 290, 14, fill_w, color)
+            draw.text((348, y), value, font=f_val, fill=COLOR_FG)
 
-        mem = m["mem"].get(instance, 0)
-        y = 54
-        draw.text((8, y), "MEM", font=f_lbl, fill=COLOR_SUB)
-        self._draw_bar(draw, 50, y + 2, 290, 14, mem, _bar_color(mem))
-        draw.text((348, y), f"{mem:4.1f}%", font=f_val, fill=COLOR_FG)
-
-        disk = m["disk"].get(instance, 0)
-        y = 76
-        draw.text((8, y), "Disk", font=f_lbl, fill=COLOR_SUB)
-        self._draw_bar(draw, 50, y + 2, 290, 14, disk, _bar_color(disk))
-        draw.text((348, y), f"{disk:4.1f}%", font=f_val, fill=COLOR_FG)
-
-        l1  = m["load1"].get(instance,  0)
-        l5  = m["load5"].get(instance,  0)
-        l15 = m["load15"].get(instance, 0)
         y = 98
         draw.text((8, y), "Load", font=f_lbl, fill=COLOR_SUB)
-        draw.text((52, y), f"{l1:.2f}  {l5:.2f}  {l15:.2f}", font=f_val, fill=COLOR_FG)
+        draw.text((52, y), load, font=f_val, fill=COLOR_FG)
 
-        rx = m["net_rx"].get(instance, 0)
-        tx = m["net_tx"].get(instance, 0)
         y = 118
         draw.text((8, y), "Net", font=f_lbl, fill=COLOR_SUB)
-        draw.text((42, y), f"↓{_fmt_bytes(rx)}  ↑{_fmt_bytes(tx)}", font=f_mini, fill=COLOR_FG)
+        draw.text((42, y), net, font=f_mini, fill=COLOR_FG)
 
-        history = m["mem_history"].get(instance, [])
         spark_y = 138
         draw.rectangle((8, spark_y, 391, 228), fill=(245, 248, 255))
         draw.text((8, spark_y + 1), "MEM 1h", font=f_mini, fill=COLOR_SUB)
-        self._draw_sparkline(draw, 8, spark_y + 14, 384, 74, history)
+        self._draw_sparkline(draw, 8, spark_y + 14, spark)
 
         return img
 
     # ── 2×2 ノード画面 ────────────────────────────────────────────────────────
 
-    def _screen_nodes(self, instances: list[str], m: dict, title: str) -> Image.Image:
+    def _screen_nodes(self, vm: tuple) -> Image.Image:
+        title, cards = vm
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         positions = [(0, 0), (400, 0), (0, 240), (400, 240)]
-        for i, inst in enumerate(instances[:4]):
-            card = self._node_card(inst, m)
-            canvas.paste(card, positions[i])
+        for i, card_vm in enumerate(cards):
+            canvas.paste(self._node_card(card_vm), positions[i])
         self._stamp(canvas, title)
         return canvas
 
     # ── ヘルス一覧画面 ────────────────────────────────────────────────────────
 
-    def _screen_health(self, m: dict) -> Image.Image:
+    def _screen_health(self, rows: tuple) -> Image.Image:
         canvas = Image.new("RGB", (800, 480), COLOR_BG)
         draw   = ImageDraw.Draw(canvas)
 
@@ -213,51 +261,24 @@ class NodeUpdater(PrometheusBase):
 
         draw.line([(0, 44), (800, 44)], fill=COLOR_BORDER, width=1)
 
-        all_inst = sorted(
-            m["up"].keys(),
-            key=lambda i: (0 if m["up"].get(i, 0) < 1 else 1, _short_host(i))
-        )
-
-        row_h   = 26
-        start_y = 48
-        max_rows = (480 - start_y) // row_h
-
-        for idx, inst in enumerate(all_inst):
-            col = 0 if idx < max_rows else 1
-            row = idx if idx < max_rows else idx - max_rows
-            if col == 1 and row >= max_rows:
-                break
+        for idx, (host, dot_color, host_color, cells) in enumerate(rows):
+            col = 0 if idx < HEALTH_ROWS else 1
+            row = idx if idx < HEALTH_ROWS else idx - HEALTH_ROWS
 
             x = col * 400 + 8
-            y = start_y + row * row_h
-
-            up   = m["up"].get(inst, 0)
-            cpu  = m["cpu"].get(inst)
-            mem  = m["mem"].get(inst)
-            disk = m["disk"].get(inst)
-            l1   = m["load1"].get(inst)
+            y = HEALTH_START_Y + row * HEALTH_ROW_H
 
-            dot_color = COLOR_OK if up >= 1 else COLOR_CRIT
             draw.ellipse((x, y + 5, x + 10, y + 15), fill=dot_color)
+            draw.text((x + 14, y + 3), host, font=f_host, fill=host_color)
 
-            host = _short_host(inst)[:16]
-            draw.text((x + 14, y + 3), host, font=f_host,
-                      fill=COLOR_FG if up else COLOR_CRIT)
-
-            if not up:
+            if cells is None:
                 draw.text((x + 130, y + 3), "DOWN", font=f_val, fill=COLOR_CRIT)
                 continue
 
-            if cpu is not None:
-                draw.text((x + 130, y + 3), f"{cpu:4.0f}%", font=f_val, fill=_bar_color(cpu))
-            if mem is not None:
-                draw.text((x + 190, y + 3), f"{mem:4.0f}%", font=f_val, fill=_bar_color(mem))
-            if disk is not None:
-                draw.text((x + 250, y + 3), f"{disk:4.0f}%", font=f_val, fill=_bar_color(disk))
-            if l1 is not None:
-                draw.text((x + 310, y + 3), f"{l1:.2f}", font=f_val, fill=COLOR_FG)
+            for cx, text, color in cells:
+                draw.text((x + cx, y + 3), text, font=f_val, fill=color)
 
-            draw.line([(col * 400, y + row_h - 1), (col * 400 + 398, y + row_h - 1)],
+            draw.line([(col * 400, y + HEALTH_ROW_H - 1), (col * 400 + 398, y + HEALTH_ROW_H - 1)],
                       fill=(230, 230, 230), width=1)
 
         draw.line([(400, 26), (400, 479)], fill=COLOR_BORDER, width=1)
@@ -270,19 +291,18 @@ class NodeUpdater(PrometheusBase):
         print("[NodeUpdater] メトリクス取得中...")
         m = self._collect_metrics()
 
-        img1 = self._screen_nodes(PROXMOX_INSTANCES, m, "Proxmox Cluster")
-
         non_proxmox = [i for i in m["up"].keys() if i not in PROXMOX_INSTANCES]
         up_nodes    = [i for i in non_proxmox if m["up"].get(i, 0) >= 1]
         down_nodes  = [i for i in non_proxmox if m["up"].get(i, 0) < 1]
         random.shuffle(up_nodes)
         random.shuffle(down_nodes)
         selected = (up_nodes + down_nodes)[:4]
-        img2 = self._screen_nodes(selected, m, "Random Nodes")
-
-        img3 = self._screen_health(m)
 
-        self.image_request([img1, img2, img3])
+        self._push_screens([
+            (self._vm_nodes(PROXMOX_INSTANCES, m, "Proxmox Cluster"), self._screen_nodes),
+            (self._vm_nodes(selected, m, "Random Nodes"),              self._screen_nodes),
+            (self._vm_health(m),                                        self._screen_health),
+        ])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+OdptCalendar: 日付 → その日に適用される ODPT カレンダー id の対応表。
+
+  - 国民の祝日 (固定日・ハッピーマンデー・春分/秋分・振替休日・国民の休日) と
+    年末年始を土休日ダイヤとして扱う
+  - 1 年分の表を初回参照時にまとめて作り、以降の参照は dict 引きのみ
+  - 事業者固有のカレンダー (odpt:Calendar の odpt:day) を登録すると、該当日の先頭に載る
+"""
+
+from datetime import date, timedelta
+
+
+CALENDAR_PREFIX = "odpt.Calendar:"
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# (月, 日, 名称)
+FIXED_HOLIDAYS = [
+    (1, 1, "元日"), (2, 11, "建国記念の日"), (2, 23, "天皇誕生日"), (4, 29, "昭和の日"),
+    (5, 3, "憲法記念日"), (5, 4, "みどりの日"), (5, 5, "こどもの日"), (8, 11, "山の日"),
+    (11, 3, "文化の日"), (11, 23, "勤労感謝の日"),
+]
+# (月, 第 n, 名称) — 第 n 月曜日
+HAPPY_MONDAYS = [
+    (1, 2, "成人の日"), (7, 3, "海の日"), (9, 3, "敬老の日"), (10, 2, "スポーツの日"),
+]
+# 祝日ではないが、多くの事業者が土休日ダイヤで運行する日
+YEAR_END_DAYS = [(12, 30), (12, 31), (1, 2), (1, 3)]
+
+
+def _nth_monday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _equinox_day(year: int, base: float) -> int:
+    """春分 (base=20.8431) / 秋分 (base=23.2488) の日 (1980〜2099 年の近似式)"""
+    return int(base + 0.242194 * (year - 1980)) - (year - 1980) // 4
+
+
+def japanese_holidays(year: int) -> dict[date, str]:
+    """year の国民の祝日・振替休日・国民の休日 → 名称"""
+    holidays = {date(year, m, d): name for m, d, name in FIXED_HOLIDAYS}
+    for m, n, name in HAPPY_MONDAYS:
+        holidays[_nth_monday(year, m, n)] = name
+    holidays[date(year, 3, _equinox_day(year, 20.8431))] = "春分の日"
+    holidays[date(year, 9, _equinox_day(year, 23.2488))] = "秋分の日"
+
+    # 国民の休日: 前後を祝日に挟まれた平日
+    for d in sorted(holidays):
+        between = d + timedelta(days=1)
+        if (between not in holidays and between + timedelta(days=1) in holidays
+                and between.weekday() != 6):
+            holidays[between] = "国民の休日"
+
+    # 振替休日: 日曜の祝日の後、最初の祝日でない日
+    for d in sorted(holidays):
+        if d.weekday() == 6:
+            sub = d + timedelta(days=1)
+            while sub in holidays:
+                sub += timedelta(days=1)
+            holidays[sub] = "振替休日"
+    return holidays
+
+
+class CalendarService:
+
+    def __init__(self):
+        self._years: dict[int, dict[date, tuple[str, ...]]] = {}
+        # 事業者固有カレンダー id → 該当日
+        self._specific: dict[str, set[date]] = {}
+
+    def _build_year(self, year: int) -> dict[date, tuple[str, ...]]:
+        holidays = japanese_holidays(year)
+        year_end = {date(year, m, d) for m, d in YEAR_END_DAYS}
+        table = {}
+        d = date(year, 1, 1)
+        while d.year == year:
+            weekday = d.weekday()
+            if d in holidays or d in year_end or weekday == 6:
+                kinds = (["Sunday"] if weekday == 6 else []) + ["Holiday", "SaturdayHoliday"]
+            elif weekday == 5:
+                kinds = ["Saturday", "SaturdayHoliday"]
+            else:
+                kinds = [DAY_NAMES[weekday], "Weekday"]
+            specific = [cal for cal, days in self._specific.items() if d in days]
+            table[d] = tuple(specific + [CALENDAR_PREFIX + k for k in kinds])
+            d += timedelta(days=1)
+        return table
+
+    def resolve(self, day: date) -> tuple[str, ...]:
+        """day に適用されうるカレンダー id (優先度の高い順)"""
+        table = self._years.get(day.year)
+        if table is None:
+            table = self._years[day.year] = self._build_year(day.year)
+        return table[day]
+
+    def is_known(self, calendar_id: str) -> bool:
+        """標準カレンダーか登録済みの事業者固有カレンダーなら True"""
+        if calendar_id in self._specific:
+            return True
+        return calendar_id.removeprefix(CALENDAR_PREFIX) in DAY_NAMES + [
+            "Weekday", "Holiday", "SaturdayHoliday"]
+
+    def add_specific(self, calendar_id: str, days):
+        """odpt:Calendar の odpt:day ("YYYY-MM-DD" のリスト) を登録する"""
+        dates = {date.fromisoformat(d) for d in days}
+        old = self._specific.get(calendar_id, set())
+        if old == dates:
+            return
+        self._specific[calendar_id] = dates
+        for year in {d.year for d in dates | old} & self._years.keys():
+            self._years[year] = self._build_year(year)
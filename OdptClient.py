@@ -0,0 +1,70 @@
+"""
+OdptClient: ODPT API の共有クライアント。
+
+  - 1 つの requests.Session を使い回し、同時接続数ぶんの接続をプールする
+  - 複数リクエストはスレッドプール (同時実行数に上限あり) で並行に投げる
+  - 1 リクエストごとの timeout と、まとめて投げた分全体の締め切り (deadline) を持つ。
+    締め切りに間に合わなかった分は結果から外し、待たずに先へ進む
+  - 時刻表などの日次の更新 (UPDATE_DEADLINE) と運行情報 (LIVE_DEADLINE) は別々の締め切りで待つ。
+    日次の更新が遅くても運行情報の取得時間は削られない
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+MAX_WORKERS     = 8
+REQUEST_TIMEOUT = (3.05, 10)   # (接続, 読み込み) 秒
+UPDATE_DEADLINE = 20           # 1 回の更新で時刻表・カレンダーの更新を待つ合計の上限 (秒)
+LIVE_DEADLINE   = 10           # 運行情報 (更新ごとに必ず取得する分) を待つ上限 (秒)
+
+
+class OdptClient:
+
+    def __init__(self, api_base: str, api_key: str,
+                 max_workers: int = MAX_WORKERS, timeout=REQUEST_TIMEOUT):
+        self.api_base = api_base
+        self.api_key  = api_key
+        self.timeout  = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # 締め切りを過ぎた呼び出しは待たずに捨てるため、プールは使い回す
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="odpt")
+
+    def get(self, resource: str, params: dict) -> list:
+        """GET {api_base}/{resource}。失敗時は例外を送出する。"""
+        resp = self.session.get(
+            f"{self.api_base}/{resource}",
+            params={**params, "acl:consumerKey": self.api_key},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def run(self, jobs: dict, deadline: float | None = None) -> dict:
+        """{key: callable} を並行に実行し {key: 戻り値} を返す。
+        deadline (time.monotonic() 基準) までに終わらなかったもの・例外になったものは含めない。"""
+        if not jobs:
+            return {}
+        if deadline is None:
+            deadline = time.monotonic() + UPDATE_DEADLINE
+        futures = {self._pool.submit(fn): key for key, fn in jobs.items()}
+        done, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+        results = {}
+        for fut in done:
+            key = futures[fut]
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                print(f"ODPT request failed for {key}: {e}")
+        for fut in pending:
+            fut.cancel()
+            print(f"ODPT request for {futures[fut]} missed the update deadline")
+        return results
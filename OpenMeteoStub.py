@@ -0,0 +1,161 @@
+"""
+OpenMeteoStub: Open-Meteo forecast API (/v1/forecast) のローカル代替。
+WeatherUpdater をネットワークなしで動かす・キャッシュの挙動を確かめるために使う。
+
+  - hourly / daily に指定された変数だけを、緯度経度と時刻から決定的に生成する
+  - latitude / longitude がカンマ区切りの複数地点なら、地点ごとの応答を配列で返す
+  - 応答は 1 時間ごとに変わり、ETag / If-None-Match による 304 に対応する
+  - server.request_count に受け付けたリクエスト数を数える
+
+使い方:
+  python OpenMeteoStub.py --port 8089 --latency 0.2
+  WeatherUpdater(api_url="http://127.0.0.1:8089/v1/forecast")
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+JST = timezone(timedelta(hours=9))
+WEATHER_CODES = [0, 1, 2, 3, 45, 61, 63, 80, 95, 71]
+
+# 変数名 → (基準値, 振れ幅)
+HOURLY_RANGES = {
+    "temperature_2m":            (16, 8),
+    "apparent_temperature":      (15, 9),
+    "relative_humidity_2m":      (60, 25),
+    "precipitation_probability": (30, 30),
+    "wind_speed_10m":            (4, 3),
+    "pressure_msl":              (1012, 8),
+    "uv_index":                  (3, 3),
+    "winddirection_10m":         (180, 180),
+}
+
+
+def _wave(seed, t, base, amp):
+    return round(base + amp * math.sin(seed + t / 3.8), 1)
+
+
+def forecast(lat, lon, hourly, daily, now=None):
+    """1 地点分の応答 (Open-Meteo と同じ形)"""
+    now = (now or datetime.now(JST)).replace(minute=0, second=0, microsecond=0)
+    seed = (lat * 7 + lon * 13) % 10
+    start = now.replace(hour=0)
+    hours = [start + timedelta(hours=h) for h in range(7 * 24)]
+    days = [start + timedelta(days=d) for d in range(7)]
+
+    out = {
+        "latitude": lat, "longitude": lon, "timezone": "Asia/Tokyo",
+        "current_weather": {
+            "time": now.strftime("%Y-%m-%dT%H:%M"),
+            "temperature": _wave(seed, now.hour, 16, 8),
+            "windspeed": _wave(seed + 1, now.hour, 4, 3),
+            "winddirection": int(_wave(seed + 2, now.hour, 180, 180)),
+            "weathercode": WEATHER_CODES[int(seed + now.hour // 6) % len(WEATHER_CODES)],
+            "is_day": int(6 <= now.hour < 18),
+        },
+    }
+    if hourly:
+        out["hourly"] = {"time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours]}
+        for name in hourly:
+            base, amp = HOURLY_RANGES.get(name, (10, 5))
+            if name == "weathercode":
+                out["hourly"][name] = [WEATHER_CODES[int(seed + i // 6) % len(WEATHER_CODES)]
+                                       for i in range(len(hours))]
+            else:
+                out["hourly"][name] = [_wave(seed, i, base, amp) for i in range(len(hours))]
+    if daily:
+        out["daily"] = {"time": [d.strftime("%Y-%m-%d") for d in days]}
+        for name in daily:
+            if name == "weathercode":
+                values = [WEATHER_CODES[int(seed + i) % len(WEATHER_CODES)] for i in range(7)]
+            elif name == "temperature_2m_max":
+                values = [_wave(seed, i * 5, 21, 5) for i in range(7)]
+            elif name == "temperature_2m_min":
+                values = [_wave(seed, i * 5, 12, 5) for i in range(7)]
+            elif name == "precipitation_probability_max":
+                values = [int(_wave(seed + 3, i * 5, 40, 40)) for i in range(7)]
+            elif name == "sunrise":
+                values = [d.strftime("%Y-%m-%dT05:45") for d in days]
+            elif name == "sunset":
+                values = [d.strftime("%Y-%m-%dT17:20") for d in days]
+            else:
+                values = [_wave(seed, i * 5, 4, 3) for i in range(7)]
+            out["daily"][name] = values
+    return out
+
+
+def make_handler(latency: float):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, body=b"", headers=None):
+            self.send_response(code)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.server.request_count += 1
+            if latency:
+                time.sleep(latency)
+            url = urlparse(self.path)
+            if url.path != "/v1/forecast":
+                self._reply(404, b'{"error": true, "reason": "unknown path"}')
+                return
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                lats = [float(v) for v in q["latitude"].split(",")]
+                lons = [float(v) for v in q["longitude"].split(",")]
+                if len(lats) != len(lons):
+                    raise ValueError("latitude and longitude must have the same number of elements")
+            except (KeyError, ValueError) as e:
+                self._reply(400, json.dumps({"error": True, "reason": str(e)}).encode())
+                return
+
+            hourly = [v for v in q.get("hourly", "").split(",") if v]
+            daily = [v for v in q.get("daily", "").split(",") if v]
+            results = [forecast(lat, lon, hourly, daily) for lat, lon in zip(lats, lons)]
+            body = json.dumps(results if len(results) > 1 else results[0]).encode()
+
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self._reply(304, headers={"ETag": etag})
+                return
+            self._reply(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0,
+               latency: float = 0.0) -> tuple[ThreadingHTTPServer, str]:
+    """バックグラウンドスレッドで起動 → (server, forecast_url)。停止は server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), make_handler(latency))
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/forecast"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Open-Meteo forecast API stand-in")
+    ap.add_argument("--host",    default="127.0.0.1")
+    ap.add_argument("--port",    type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.0, help="応答ごとの遅延 (秒)")
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency))
+    server.request_count = 0
+    print(f"[OpenMeteoStub] http://{args.host}:{args.port}/v1/forecast で待受中...")
+    server.serve_forever()
@@ -0,0 +1,97 @@
+"""
+PageReadiness: ページを撮影してよいかの判定。固定 sleep の代わりに以下をすべて満たしたら準備完了とする。
+
+  - ページの読み込みが完了している (readyState が complete: 画像・iframe などの読み込みが終わっている)
+  - ネットワークが静か: 読み込み中の fetch / XHR がなく、リソースの読み込み完了が quiet_ms の間ない
+  - レイアウトが安定: DOM の変化・サイズ変化が quiet_ms の間ない
+  - サイトごとの CSS セレクタ (指定があれば) の要素が存在する
+
+広告や計測が流れ続けるページでも、呼び出し側の上限 (timeout) で打ち切る。
+"""
+
+import time
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+
+QUIET_MS      = 500
+PAGE_TIMEOUT  = 30     # 1 ページの読み込みを待つ上限 (秒)
+POLL_INTERVAL = 0.2
+
+# 初回呼び出しで監視を仕込み、以降は判定だけ行う
+PROBE_JS = """
+const selector = arguments[0], quietMs = arguments[1];
+if (window.__epaperStale || location.href === 'about:blank' ||
+    document.readyState === 'loading') return false;
+const now = performance.now();
+let r = window.__epaperReadiness;
+if (!r) {
+  r = window.__epaperReadiness = {changedAt: now, resourceAt: now, inflight: 0};
+  const touch = () => { r.changedAt = performance.now(); };
+  new MutationObserver(touch).observe(document.documentElement,
+      {subtree: true, childList: true, attributes: true, characterData: true});
+  if (window.ResizeObserver) {
+    const ro = new ResizeObserver(touch);
+    ro.observe(document.documentElement);
+    if (document.body) ro.observe(document.body);
+  }
+  // 既定の 250 件で止まるバッファに頼らず、完了したリソースを監視で数える
+  if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(10000);
+  if (window.PerformanceObserver) {
+    new PerformanceObserver(() => { r.resourceAt = performance.now(); })
+        .observe({type: 'resource', buffered: true});
+  }
+  // 完了していない fetch / XHR は resource timing に現れないので数えておく
+  const begin = () => { r.inflight++; r.resourceAt = performance.now(); };
+  const end = () => { r.inflight = Math.max(0, r.inflight - 1); r.resourceAt = performance.now(); };
+  if (window.fetch) {
+    const fetch = window.fetch;
+    window.fetch = function () {
+      begin();
+      return fetch.apply(this, arguments).finally(end);
+    };
+  }
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    begin();
+    this.addEventListener('loadend', end, {once: true});
+    return send.apply(this, arguments);
+  };
+  return false;
+}
+// load 前は画像や広告の読み込み中 (完了するまで resource timing に現れない)
+if (document.readyState !== 'complete' || r.inflight > 0) return false;
+if (selector && !document.querySelector(selector)) return false;
+return now - r.changedAt >= quietMs && now - r.resourceAt >= quietMs;
+"""
+
+class Readiness:
+
+    def __init__(self, selectors=None, quiet_ms=QUIET_MS, timeout=PAGE_TIMEOUT):
+        # ホスト名 → 表示されるまで待つ要素の CSS セレクタ
+        self.selectors = selectors or {}
+        self.quiet_ms = quiet_ms
+        self.timeout = timeout
+
+    def selector_for(self, url):
+        host = urlparse(url).hostname or ""
+        return self.selectors.get(host) or self.selectors.get(host.removeprefix("www."))
+
+    def probe(self, driver, url):
+        """現在のタブが撮影してよい状態なら True"""
+        try:
+            return bool(driver.execute_script(PROBE_JS, self.selector_for(url), self.quiet_ms))
+        except WebDriverException:
+            # 遷移中でドキュメントが入れ替わっている (document unloaded など) ときはまだ準備中とみなす
+            return False
+
+    def wait(self, driver, url):
+        """現在のタブが準備できるまで待つ。上限に達したら読み込みを止めて False"""
+        deadline = time.monotonic() + self.timeout
+        while not self.probe(driver, url):
+            if time.monotonic() >= deadline:
+                driver.execute_script("window.stop();")
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
@@ -1,11 +1,16 @@
+import hashlib
+import re
 import time
 from datetime import datetime, timezone, timedelta
 import requests
 from PIL import Image, ImageDraw, ImageFont
-from ImageUpdater import ImageUpdater
+from ImageUpdater import ImageUpdater, UPDATE_SLOT
 
 
 PROMETHEUS_URL = "http://monitor.cloud.rikuta:9090"
+PAGE_TTL       = UPDATE_SLOT  # ページ単位キャッシュの有効期間 (秒)。epaper.py では巡回周期に合わせて設定する
+RANK_BATCH     = 64           # 同値の系列を 1 回のクエリで取り出す上限 (超えるときはラベルの範囲を分ける)
+MAX_CODEPOINT  = 0x10FFFF - 0x800  # ラベル文字の通し番号の最大値 (サロゲートを除いたコードポイント)
 
 FONT_REG  = "./fonts/NotoSansJP-Regular.ttf"
 FONT_BOLD = "./fonts/NotoSansJP-Bold.ttf"
@@ -27,12 +32,78 @@ def _load_font(path, size):
         return ImageFont.load_default()
 
 
+def _quote_regex(pattern: str) -> str:
+    """正規表現 → `label=~"..."` に埋め込める PromQL 文字列 (エスケープ済み)"""
+    return pattern.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _label_regex(values) -> str:
+    """ラベル値リスト → `label=~"..."` に埋め込める正規表現 (PromQL 文字列エスケープ済み)"""
+    return _quote_regex("|".join(re.escape(v) for v in values))
+
+
+# ── ラベル値の辞書順の範囲 ─────────────────────────────────────────────────
+# 範囲 (prefix, lo, hi) は「prefix の直後の文字が lo..hi」のラベル値。lo が None なら prefix そのもの、
+# lo が -1 なら prefix で始まるすべて (prefix 自身を含む)。文字は _char で通し番号から戻す。
+
+def _char(n: int) -> str:
+    return chr(n if n < 0xD800 else n + 0x800)
+
+
+def _ordinal(c: str) -> int:
+    n = ord(c)
+    return n if n < 0xD800 else n - 0x800
+
+
+def _class_char(n: int) -> str:
+    """文字クラスに置ける 1 文字 (RE2 と Python の re の両方で読める形)"""
+    c = _char(n)
+    return f"\\x{ord(c):02x}" if ord(c) <= 0xFF else c
+
+
+def _range_regex(prefix: str, lo: int | None, hi: int | None) -> str:
+    if lo is None:
+        return re.escape(prefix)
+    if lo < 0:
+        return re.escape(prefix) + ".*"
+    return f"{re.escape(prefix)}[{_class_char(lo)}-{_class_char(hi)}].*"
+
+
+def _ranges_after(last: str | None) -> list[tuple]:
+    """last より後 (last が None ならすべて) のラベル値を、辞書順に並んだ範囲のリストで表す"""
+    if last is None:
+        return [("", -1, None)]
+    ranges = [(last, 0, MAX_CODEPOINT)]
+    for i in range(len(last) - 1, -1, -1):
+        n = _ordinal(last[i]) + 1
+        if n <= MAX_CODEPOINT:
+            ranges.append((last[:i], n, MAX_CODEPOINT))
+    return ranges
+
+
+def _split_range(prefix: str, lo: int, hi: int | None) -> list[tuple]:
+    """範囲を辞書順に並んだ小さな範囲に分ける"""
+    if lo < 0:
+        return [(prefix, None, None), (prefix, 0, MAX_CODEPOINT)]
+    if lo == hi:
+        return [(prefix + _char(lo), -1, None)]
+    mid = (lo + hi) // 2
+    return [(prefix, lo, mid), (prefix, mid + 1, hi)]
+
+
+def _fingerprint(view_model) -> str:
+    """表示用に整形済みの view-model (文字列・色・座標) の指紋"""
+    return hashlib.sha1(repr(view_model).encode()).hexdigest()
+
+
 class PrometheusBase(ImageUpdater):
 
     def __init__(self, prom_url: str = PROMETHEUS_URL):
         super().__init__()
         self.prom = prom_url.rstrip("/")
         self._session = requests.Session()
+        self._page_cache: dict = {}  # key → (取得時刻, データ)
+        self.page_ttl = PAGE_TTL
 
     def _query(self, promql: str, key: str = "instance") -> dict[str, float]:
         """instant query → {key_label_value: value}"""
@@ -84,6 +155,64 @@ class PrometheusBase(ImageUpdater):
             print(f"[Prometheus] multi-key query failed: {promql[:60]}... → {e}")
             return {}
 
+    def _query_ranked(self, promql: str, limit: int, after: tuple | None = None,
+                      key: str = "instance") -> list[tuple[str, float]]:
+        """promql (key ごとに 1 系列) を (値の降順, key の昇順) に並べ、after = (value, key) の行の次から
+        最大 limit 件 [(key_label_value, value)] を返す。promql の {match} には key のマッチャ
+        (先頭にカンマ付き) が差し込まれる。
+        大小は topk で Prometheus 側に決めさせ、Prometheus が順序を保証しない同値の系列だけを
+        key の辞書順の範囲に分けて取り出す。1 回のクエリで返る系列は limit / RANK_BATCH 件以下。"""
+        if limit <= 0:
+            return []
+        expr = promql.format(match="")
+        rows, bound = [], None
+        if after is not None:
+            bound, last = after
+            rows += self._query_ties(promql, key, bound, last, limit)
+        while len(rows) < limit:
+            below = f"({expr}) < {bound!r}" if bound is not None else expr
+            top = self._query(f"topk({limit - len(rows)}, {below})", key=key)
+            if not top:
+                break
+            # 最小値より大きい行は確定。最小値と同値の行は topk の外にもありうるので取り直す
+            floor = min(top.values())
+            rows += sorted(((k, v) for k, v in top.items() if v > floor),
+                           key=lambda kv: (-kv[1], kv[0]))
+            rows += self._query_ties(promql, key, floor, None, limit - len(rows))
+            bound = floor
+        return rows[:limit]
+
+    def _query_ties(self, promql: str, key: str, value: float, after: str | None,
+                    limit: int) -> list[tuple[str, float]]:
+        """値が value の系列を key の昇順に、after の次から最大 limit 件"""
+        out = []
+        pending = _ranges_after(after)
+        while pending and len(out) < limit:
+            prefix, lo, hi = pending.pop(0)
+            match = f', {key}=~"{_quote_regex(_range_regex(prefix, lo, hi))}"'
+            expr = f"({promql.format(match=match)}) == {value!r}"
+            if lo is not None:
+                n = self._query_scalar(f"count({expr})")
+                if not n:
+                    continue
+                if n > RANK_BATCH:
+                    pending[:0] = _split_range(prefix, lo, hi)
+                    continue
+            out += sorted(self._query(expr, key=key).items())
+        return out[:limit]
+
+    def _seek_ranked(self, promql: str, offset: int, page: int,
+                     key: str = "instance") -> tuple | None:
+        """_query_ranked の順で offset 件目の直前の行の (value, key)。page 件ずつたどる"""
+        after = None
+        while offset > 0:
+            rows = self._query_ranked(promql, min(page, offset), after, key=key)
+            if not rows:
+                break
+            after = (rows[-1][1], rows[-1][0])
+            offset -= len(rows)
+        return after
+
     def _query_range(self, promql: str, duration_s: int = 3600, step: int = 300,
                      key: str = "instance") -> dict[str, list[float]]:
         """range query → {key_label_value: [values]}"""
@@ -108,6 +237,32 @@ class PrometheusBase(ImageUpdater):
             print(f"[Prometheus] range query failed: {promql[:60]}... → {e}")
             return {}
 
+    def _cached_page(self, key, fetch):
+        """key ごとに fetch() の結果を保持し、page_ttl を過ぎたものだけ再取得する"""
+        now = time.time()
+        hit = self._page_cache.get(key)
+        if hit is not None and now - hit[0] < self.page_ttl:
+            return hit[1]
+        data = fetch()
+        # 期限切れのページはここで捨てる (offset ごとのキーが溜まり続けないように)
+        self._page_cache = {k: v for k, v in self._page_cache.items()
+                            if now - v[0] < self.page_ttl}
+        self._page_cache[key] = (now, data)
+        return data
+
+    def _push_screens(self, screens: list[tuple]):
+        """screens: [(view_model, render)] を各ディスプレイへ送る。
+        表示中の画面と view_model の指紋が一致するディスプレイは描画も送信もしない。"""
+        images, tokens = [], []
+        for url, (vm, render) in zip(self.urls, screens):
+            token = (type(self).__name__, _fingerprint(vm))
+            tokens.append(token)
+            images.append(None if self.displayed_token(url) == token else render(vm))
+        skipped = sum(img is None for img in images)
+        if skipped:
+            print(f"[{type(self).__name__}] 表示内容に変化なし: {skipped}/{len(images)} 画面をスキップ")
+        self.image_request(images, tokens)
+
     def _stamp(self, img: Image.Image, title: str = ""):
         draw = ImageDraw.Draw(img)
         jst  = timezone(timedelta(hours=9))
@@ -0,0 +1,312 @@
+"""
+PrometheusStub: Prometheus HTTP API (/api/v1/query, /api/v1/query_range) のローカル代替。
+NodeUpdater / KafkaUpdater / ElasticSearchUpdater をライブの Prometheus なしで
+動かす・ベンチマークするために使う。
+
+モード:
+  synthetic — クエリの集約ラベル (by (...)) とメトリクス名から、指定したノード /
+              トピック / インデックス数の系列を決定的に生成する
+  fixture   — 録画済み JSON ({"query": {promql: result}, "query_range": {...}}) を返す
+  record    — 本物の Prometheus へ中継し、応答を fixture JSON に保存する
+
+使い方:
+  python PrometheusStub.py --nodes 100 --topics 100 --indices 100 --latency 0.05
+  python PrometheusStub.py --record http://monitor.cloud.rikuta:9090 --fixture ./cache/prom.json
+  python PrometheusStub.py --fixture ./cache/prom.json
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+
+HEALTH_COLORS = ["green", "yellow", "red"]
+
+# 集約されていない生メトリクス (正規表現) のラベル
+METRIC_LABELS = [
+    (r"\belasticsearch_index_health_status\b",         ("index", "color")),
+    (r"\belasticsearch_cluster_health_status\b",       ("color",)),
+    (r"\belasticsearch_indices_search_query_total\b",  ("name",)),
+    (r"\belasticsearch_indices_indexing_index_total\b", ("name",)),
+    (r"\bkafka_topic_partitions\b",                    ("topic",)),
+    (r"\bnode_",                                       ("instance",)),
+    (r"\bup\b",                                        ("instance",)),
+]
+
+# メトリクス名 → (最小値, 最大値)
+METRIC_SCALE = [
+    ("* 100",                     (0, 100)),
+    ("node_load",                 (0, 8)),
+    ("node_hwmon_temp",           (30, 85)),
+    ("node_network",              (0, 5_000_000)),
+    ("kafka_consumergroup_lag",   (0, 50_000)),
+    ("under_replicated",          (0, 1)),
+    ("kafka_topic_partitions",    (1, 32)),
+    ("docs_primary",              (0, 2_000_000_000)),
+    ("store_size_bytes",          (0, 2 << 40)),
+    ("elasticsearch_indices",     (0, 500)),
+    ("kafka_brokers",             (3, 3)),
+    ("number_of_nodes",           (5, 5)),
+    ("number_of_data_nodes",      (3, 3)),
+    ("active_shards",             (10, 5000)),
+    ("elasticsearch_cluster",     (0, 0)),
+]
+
+BY_RE      = re.compile(r"\bby\s*\(([^)]*)\)")
+MATCHER_RE = re.compile(r'(\w+)\s*(=~|!~)\s*"((?:[^"\\]|\\.)*)"')
+TOPK_RE    = re.compile(r"topk\s*(?:by\s*\(([^)]*)\)\s*)?\(\s*(\d+)\s*,")
+COUNT_RE   = re.compile(r"\s*count\s*\((.*)\)\s*$", re.DOTALL)
+# 式の後ろの比較 (フィルタ): `) < 12.5`, `} == 1`
+COMPARE_RE = re.compile(r"[)}]\s*(==|!=|<=|>=|<|>)\s*([-+]?(?:[0-9.]+(?:[eE][-+]?\d+)?|[Ii]nf))")
+SELECTOR_RE = re.compile(r'\w+\s*(?:=~|!~|!=|=)\s*"(?:[^"\\]|\\.)*"')
+COMPARE_OPS = {
+    "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b,
+    "<":  lambda a, b: a < b,  ">":  lambda a, b: a > b,
+}
+
+
+def _unquote(s: str) -> str:
+    """PromQL 文字列リテラルのエスケープを戻す"""
+    return re.sub(r"\\(.)", r"\1", s)
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("\x00".join(map(str, parts)).encode())
+
+
+class SyntheticSeries:
+    """ノード / トピック / CG / インデックス数から決定的な系列を生成する"""
+
+    def __init__(self, nodes: int = 10, topics: int = 10, groups: int | None = None,
+                 indices: int = 10, es_nodes: int = 5):
+        groups = groups if groups is not None else max(topics // 4, 1)
+        proxmox = [f"proxmox{i}.cloud.rikuta:9100" for i in range(1, 5)]
+        self.labels = {
+            "instance":      (proxmox + [f"node{i:04d}.server.rikuta:9100"
+                                         for i in range(max(nodes - 4, 0))])[:nodes],
+            "topic":         [f"topic-{i:04d}" for i in range(topics)],
+            "consumergroup": [f"group-{i:04d}" for i in range(groups)],
+            "index":         [f"logs-{i:05d}" for i in range(indices)],
+            "name":          [f"es-node-{i}" for i in range(es_nodes)],
+            "color":         HEALTH_COLORS,
+        }
+
+    # ── 系列の組み立て ────────────────────────────────────────────────────
+
+    def _label_sets(self, labels: tuple) -> list[dict]:
+        if not labels:
+            return [{}]
+        if set(labels) == {"consumergroup", "topic"}:
+            # 各 CG は 4 トピックを購読
+            topics = self.labels["topic"]
+            return [
+                {"consumergroup": g, "topic": topics[(gi * 3 + k) % len(topics)]}
+                for gi, g in enumerate(self.labels["consumergroup"])
+                for k in range(min(4, len(topics)))
+            ]
+        if "color" in labels and len(labels) > 1:
+            other = next(l for l in labels if l != "color")
+            return [{other: v, "color": c} for v in self.labels[other] for c in HEALTH_COLORS]
+        sets = [{}]
+        for label in labels:
+            sets = [dict(s, **{label: v}) for s in sets for v in self.labels.get(label, [""])]
+        return sets
+
+    def _value(self, promql: str, metric: dict, t: float = 0.0) -> float:
+        if "color" in metric:
+            # エンティティごとに 1 色だけ 1 (大半は green)
+            owner = {k: v for k, v in metric.items() if k != "color"}
+            r = _seed(sorted(owner.items())) % 20
+            color = "red" if r == 0 else "yellow" if r < 3 else "green"
+            return 1.0 if metric["color"] == color else 0.0
+        lo, hi = next((rng for key, rng in METRIC_SCALE if key in promql), (0, 100))
+        # ラベルマッチャ・比較・topk などを除いた式で値を決める (絞り込み方が違っても同じ系列は同じ値)
+        shape = COMPARE_RE.sub(")", SELECTOR_RE.sub("", promql))
+        shape = re.sub(r"\b(?:topk|sort_desc|count)\b|\d+\s*,|[\s(){},]", "", shape)
+        rnd = random.Random(_seed(shape, sorted(metric.items())))
+        base = lo + (hi - lo) * rnd.random() ** 3
+        if "kafka_consumergroup_lag" in promql and rnd.random() < 0.5:
+            base = 0.0
+        if "offset" in promql:
+            # Δ系: 元の値の ±5%
+            return round(base * (rnd.random() - 0.5) * 0.1)
+        return base * (1 + 0.05 * ((_seed(t) % 100) / 100 - 0.5)) if t else base
+
+    def _series(self, promql: str) -> list[dict]:
+        labels: list[str] = []
+        for group in BY_RE.findall(promql):
+            labels += [l.strip() for l in group.split(",") if l.strip() and l.strip() not in labels]
+        if not labels and not re.match(r"\s*(sum|count|max|min|avg)\s*\(", promql):
+            labels = list(next((ls for rx, ls in METRIC_LABELS if re.search(rx, promql)), ()))
+        series = self._label_sets(tuple(labels))
+
+        for label, op, pattern in MATCHER_RE.findall(promql):
+            rx = re.compile(_unquote(pattern))
+            keep = op == "=~"
+            series = [s for s in series if label not in s or bool(rx.fullmatch(s[label])) == keep]
+        return series
+
+    def instant(self, promql: str) -> list[dict]:
+        now = time.time()
+        count = COUNT_RE.match(promql)
+        if count:
+            n = len(self.instant(count.group(1)))
+            return [{"metric": {}, "value": [now, str(n)]}] if n else []
+        series = self._series(promql)
+        samples = [(s, self._value(promql, s)) for s in series]
+        for op, operand in COMPARE_RE.findall(promql):
+            samples = [(s, v) for s, v in samples if COMPARE_OPS[op](v, float(operand))]
+
+        topk = TOPK_RE.search(promql)
+        if topk:
+            by, k = topk.group(1), int(topk.group(2))
+            keys = [l.strip() for l in by.split(",")] if by else []
+            buckets: dict[tuple, list] = {}
+            for s, v in samples:
+                buckets.setdefault(tuple(s.get(l) for l in keys), []).append((s, v))
+            samples = [x for b in buckets.values()
+                       for x in sorted(b, key=lambda x: -x[1])[:k]]
+        if "sort_desc" in promql:
+            samples.sort(key=lambda x: -x[1])
+        return [{"metric": s, "value": [now, str(v)]} for s, v in samples]
+
+    def range(self, promql: str, start: float, end: float, step: float) -> list[dict]:
+        ts = [start + i * step for i in range(int((end - start) // step) + 1)]
+        return [
+            {"metric": s, "values": [[t, str(self._value(promql, s, t))] for t in ts]}
+            for s in self._series(promql)
+        ]
+
+
+class FixtureStore:
+    """録画済み応答 {"query": {promql: result}, "query_range": {promql: result}}"""
+
+    def __init__(self, path: str, upstream: str | None = None):
+        self.path     = path
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self._lock    = threading.Lock()
+        self._session = requests.Session()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except FileNotFoundError:
+            self.data = {"query": {}, "query_range": {}}
+
+    def _record(self, kind: str, params: dict) -> list[dict]:
+        r = self._session.get(f"{self.upstream}/api/v1/{kind}", params=params, timeout=20)
+        r.raise_for_status()
+        result = r.json()["data"]["result"]
+        with self._lock:
+            self.data[kind][params["query"]] = result
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False)
+        return result
+
+    def instant(self, promql: str) -> list[dict]:
+        if self.upstream:
+            return self._record("query", {"query": promql})
+        return self.data["query"].get(promql, [])
+
+    def range(self, promql: str, start: float, end: float, step: float) -> list[dict]:
+        if self.upstream:
+            return self._record("query_range",
+                                {"query": promql, "start": start, "end": end, "step": step})
+        result = self.data["query_range"].get(promql, [])
+        # 録画時刻を要求された区間の末尾に揃える
+        out = []
+        for item in result:
+            n = len(item["values"])
+            out.append({"metric": item["metric"],
+                        "values": [[end - (n - 1 - i) * step, v[1]]
+                                   for i, v in enumerate(item["values"])]})
+        return out
+
+
+def make_handler(source, latency: float = 0.0):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _params(self) -> dict:
+            qs = urlparse(self.path).query
+            if self.command == "POST":
+                length = int(self.headers.get("Content-Length", 0))
+                qs = self.rfile.read(length).decode()
+            return {k: v[0] for k, v in parse_qs(qs).items()}
+
+        def _reply(self, code: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _handle(self):
+            if latency:
+                time.sleep(latency)
+            path = urlparse(self.path).path
+            p = self._params()
+            try:
+                if path == "/api/v1/query":
+                    result = source.instant(p["query"])
+                    kind = "vector"
+                elif path == "/api/v1/query_range":
+                    result = source.range(p["query"], float(p["start"]),
+                                          float(p["end"]), float(p["step"]))
+                    kind = "matrix"
+                else:
+                    self._reply(404, {"status": "error", "error": f"unknown path {path}"})
+                    return
+            except Exception as e:
+                self._reply(400, {"status": "error", "errorType": "bad_data", "error": str(e)})
+                return
+            self._reply(200, {"status": "success",
+                              "data": {"resultType": kind, "result": result}})
+
+        do_GET  = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(source, host: str = "127.0.0.1", port: int = 0,
+               latency: float = 0.0) -> tuple[ThreadingHTTPServer, str]:
+    """バックグラウンドスレッドで起動 → (server, base_url)。停止は server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), make_handler(source, latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prometheus API stand-in")
+    ap.add_argument("--host",    default="127.0.0.1")
+    ap.add_argument("--port",    type=int, default=9090)
+    ap.add_argument("--latency", type=float, default=0.0, help="応答ごとの遅延 (秒)")
+    ap.add_argument("--nodes",   type=int, default=10)
+    ap.add_argument("--topics",  type=int, default=10)
+    ap.add_argument("--groups",  type=int, default=None)
+    ap.add_argument("--indices", type=int, default=10)
+    ap.add_argument("--fixture", help="fixture JSON (指定時は synthetic の代わりに使用)")
+    ap.add_argument("--record",  help="録画元の Prometheus URL (--fixture に保存)")
+    args = ap.parse_args()
+
+    if args.fixture:
+        source = FixtureStore(args.fixture, upstream=args.record)
+    else:
+        source = SyntheticSeries(args.nodes, args.topics, args.groups, args.indices)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(source, args.latency))
+    print(f"[PrometheusStub] http://{args.host}:{args.port} で待受中...")
+    server.serve_forever()
@@ -1,7 +1,51 @@
 from ImageUpdater import ImageUpdater
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import yfinance as yf
 import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
+from BarStore import BarStore
+
+DAY = 86400
+
+# 保存する足: 5 分足 (直近 INTRADAY_KEEP_DAYS 日) と日足 (DAILY_BACKFILL 分)。週足は日足から作る
+INTRADAY = "5m"
+INTRADAY_BACKFILL = "5d"
+INTRADAY_KEEP_DAYS = 7
+DAILY_BACKFILL = "5y"
+DAILY_BACKFILL_DAYS = 5 * 365
+
+# 表示期間: (ラベル, 使う足, 期間 (秒), X 軸の日付書式)。更新ごとに順に切り替える
+HORIZONS = [
+    ("1D", INTRADAY, 1 * DAY,   "%H:%M"),
+    ("1M", "1d",     31 * DAY,  "%m/%d"),
+    ("1Y", "1d",     365 * DAY, "%Y/%m"),
+    ("5Y", "1w",     5 * 365 * DAY, "%Y/%m"),
+]
+CHART_TZ = "Asia/Tokyo"
+
+# 1 画面 = 400×240 の 4 分割。各チャートは別スレッドで描いてから貼り合わせる
+QUADRANT = (400, 240)
+POSITIONS = [(0, 0), (400, 0), (0, 240), (400, 240)]
+WIDTH_CACHE_MAX = 1024
+
+
+@functools.lru_cache(maxsize=WIDTH_CACHE_MAX)
+def _format_value(value, unit, pos):
+    # 小数点以下の桁数調整
+    if value >= 1000:
+        val_str = f"{value:,.0f}"
+    else:
+        val_str = f"{value:,.2f}"
+
+    if pos == "prefix":
+        return f"{unit}{val_str}"
+    else:
+        return f"{val_str}{unit}"
+
 
 class StockUpdater(ImageUpdater):
 
@@ -10,6 +54,17 @@ class StockUpdater(ImageUpdater):
         
         self.FONT_BOLD_PATH = "./fonts/NotoSansJP-Bold.ttf"
         self.FONT_REG_PATH = "./fonts/NotoSansJP-Regular.ttf"
+
+        # 足の蓄積先。更新ごとに最後に保存した足以降だけを取得する
+        self.store = BarStore()
+        self._tiers = {}          # (銘柄, 足) → pd.Series (ストアから読み込み・週足へ集約したもの)
+        self._backfilled = set()  # このプロセスで期間分の取得を済ませた (銘柄, 足)
+        self._horizon = 0         # 次に表示する HORIZONS の位置
+
+        self._pool = ThreadPoolExecutor(max_workers=len(POSITIONS), thread_name_prefix="stock-chart")
+        self._local = threading.local()   # フォントはスレッドごとに 1 回だけ読み込む (FreeType は共有しない)
+        self._widths = {}                 # (文字列, フォント) → 描画幅 (px)。描画スレッド間で共有する
+        self._widths_lock = threading.Lock()
         
         # 設定: 銘柄、名称、単位、単位の位置(prefix/suffix)
         self.SCREENS_CONFIG = [
@@ -36,43 +91,150 @@ class StockUpdater(ImageUpdater):
             ]
         ]
 
-    def fetch_data(self):
-        print("Fetching market data...")
-        all_tickers = []
-        for screen in self.SCREENS_CONFIG:
-            for item in screen:
-                all_tickers.append(item["ticker"])
-        
-        # 1ヶ月分、日足
-        data = yf.download(all_tickers, period="1mo", interval="1d", progress=False)['Close']
+    def _all_tickers(self):
+        return [item["ticker"] for screen in self.SCREENS_CONFIG for item in screen]
+
+    def _download_close(self, tickers, **kwargs):
+        """yf.download の終値 (列 = 銘柄)"""
+        data = yf.download(tickers, progress=False, **kwargs)["Close"]
+        if isinstance(data, pd.Series):
+            data = data.to_frame(tickers[0])
         return data
 
-    def format_value(self, value, unit, pos):
-        """数値を単位付きの文字列に変換するヘルパー"""
-        # 小数点以下の桁数調整
-        if value >= 1000:
-            val_str = f"{value:,.0f}"
-        else:
-            val_str = f"{value:,.2f}"
+    def _store_close(self, data, interval):
+        for ticker in data.columns:
+            series = data[ticker].dropna()
+            if series.empty:
+                continue
+            index = series.index
+            if index.tz is not None:
+                index = index.tz_convert("UTC").tz_localize(None)
+            epoch = (index - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+            self.store.upsert(ticker, interval, zip(epoch.tolist(), series.astype(float).tolist()))
 
-        if pos == "prefix":
-            return f"{unit}{val_str}"
+    def sync(self, interval):
+        """ストアの interval の足を最新にする。保存済みの銘柄は各自の最後の足の日から (当日分を取り直すため) 取得し、
+        保存分が期間に満たない銘柄は期間分を一度だけ取得する。取得に失敗した銘柄は保存済みのデータのまま。"""
+        if interval == INTRADAY:
+            period, depth = INTRADAY_BACKFILL, 0
         else:
-            return f"{val_str}{unit}"
+            period, depth = DAILY_BACKFILL, DAILY_BACKFILL_DAYS * DAY
+        now = int(time.time())
+
+        last, backfill = {}, []
+        for t in self._all_tickers():
+            first = self.store.first_ts(t, interval)
+            # 以前の版で 1 か月分しか保存していない銘柄も、期間分を一度だけ取り直す
+            short = first is not None and first > now - depth + 31 * DAY
+            if first is None or (short and (t, interval) not in self._backfilled):
+                backfill.append(t)
+            else:
+                last[t] = self.store.last_ts(t, interval)
+
+        if backfill:
+            try:
+                self._store_close(self._download_close(backfill, period=period, interval=interval), interval)
+                self._backfilled.update((t, interval) for t in backfill)
+            except Exception as e:
+                print(f"StockUpdater: {interval} の期間取得に失敗 {backfill}: {e}")
+        # 差分は最後の足の日ごとにまとめて取得する (更新の止まった銘柄に他の銘柄の取得範囲を引きずられない)
+        groups = {}
+        for t, ts in last.items():
+            groups.setdefault(pd.Timestamp(ts, unit="s").strftime("%Y-%m-%d"), []).append(t)
+        for start, tickers in sorted(groups.items()):
+            try:
+                self._store_close(self._download_close(tickers, start=start, interval=interval), interval)
+            except Exception as e:
+                print(f"StockUpdater: {interval} の差分取得に失敗 {tickers} ({start}〜): {e}")
+
+        if interval == INTRADAY:
+            for t in self._all_tickers():
+                self.store.prune(t, interval, now - INTRADAY_KEEP_DAYS * DAY)
+        # 読み込み済みの系列を捨てる (週足は日足から作り直す)
+        for key in [k for k in self._tiers if k[1] == interval or (interval == "1d" and k[1] == "1w")]:
+            del self._tiers[key]
+
+    def tier(self, ticker, interval):
+        """ticker の終値の系列 (UTC)。"1w" は日足を週ごとに集約して作る"""
+        key = (ticker, interval)
+        if key not in self._tiers:
+            if interval == "1w":
+                series = self.tier(ticker, "1d").resample("W-FRI").last().dropna()
+            else:
+                rows = self.store.bars(ticker, interval)
+                ts, closes = zip(*rows) if rows else ((), ())
+                series = pd.Series(closes, index=pd.to_datetime(ts, unit="s"), dtype=float)
+            self._tiers[key] = series
+        return self._tiers[key]
 
-    def draw_detailed_chart(self, draw, rect, series, config):
+    def fetch_data(self, horizon=None):
+        """horizon (HORIZONS の要素) の期間の系列 {銘柄: pd.Series}。取得するのはその足の差分だけ"""
+        label, interval, span, _ = horizon or HORIZONS[1]
+        print(f"Fetching market data ({label})...")
+        self.sync(INTRADAY if interval == INTRADAY else "1d")
+
+        data = {}
+        for ticker in self._all_tickers():
+            series = self.tier(ticker, interval)
+            if series.empty:
+                continue
+            view = series[series.index >= series.index[-1] - pd.Timedelta(seconds=span)]
+            data[ticker] = view.tz_localize("UTC").tz_convert(CHART_TZ)
+        return data
+
+    def downsample(self, series, width):
+        """描画幅 (px) より点が多ければ、間引いて最大 width 点にする (最初と最後の点は残す)"""
+        n = len(series)
+        if n <= width or width < 2:
+            return series
+        return series.iloc[np.linspace(0, n - 1, width).round().astype(int)]
+
+    def _fonts(self):
+        """(軸, タイトル, 現在値, 変化率) のフォント。呼び出したスレッドで初回だけ読み込む"""
+        fonts = getattr(self._local, "fonts", None)
+        if fonts is None:
+            fonts = self._local.fonts = (
+                ImageFont.truetype(self.FONT_REG_PATH, 14),
+                ImageFont.truetype(self.FONT_BOLD_PATH, 22),
+                ImageFont.truetype(self.FONT_BOLD_PATH, 22),
+                ImageFont.truetype(self.FONT_REG_PATH, 18),
+            )
+        return fonts
+
+    def _text_width(self, text, font):
+        """text を font で描いたときの幅。文字列ごとにキャッシュする"""
+        key = (text, font.path, font.size)
+        with self._widths_lock:
+            width = self._widths.get(key)
+        if width is None:
+            # 測るのはロックの外で (フォントはスレッドごとなので並行して測れる)
+            width = font.getlength(text)
+            with self._widths_lock:
+                if len(self._widths) >= WIDTH_CACHE_MAX:
+                    self._widths.clear()
+                self._widths[key] = width
+        return width
+
+    def format_value(self, value, unit, pos):
+        """数値を単位付きの文字列に変換するヘルパー。(値, 単位, 位置) ごとにキャッシュする"""
+        return _format_value(float(value), unit, pos)
+
+    def draw_detailed_chart(self, draw, rect, series, config, horizon=None):
         """詳細チャート描画 (単位対応版)"""
         x_base, y_base, box_w, box_h = rect
         name = config["name"]
         unit = config["unit"]
         pos  = config["pos"]
         
+        label, _, _, date_fmt = horizon or HORIZONS[1]
         series = series.dropna()
         if len(series) < 2:
             draw.text((x_base+10, y_base+10), f"{name}: No Data", fill=(0,0,0))
             return
 
-        prices = series.tolist()
+        # 描画幅ぶんに間引く (最初と最後の点は残るので変化率は変わらない)
+        series = self.downsample(series, box_w - 80)
+        prices = series.to_numpy(dtype=float)
         dates = series.index
         
         curr_price = prices[-1]
@@ -98,54 +260,42 @@ class StockUpdater(ImageUpdater):
         gy = y_base + padding_top
 
         # スケール
-        p_max = max(prices)
-        p_min = min(prices)
+        p_max = prices.max()
+        p_min = prices.min()
         margin = (p_max - p_min) * 0.1
         if margin == 0: margin = 1
         p_max += margin
         p_min -= margin
 
-        def map_y(val):
-            return gy + gh - (val - p_min) / (p_max - p_min) * gh
-        def map_x(i):
-            return gx + i * (gw / (len(prices) - 1))
+        # 座標はまとめて計算する
+        xs = gx + np.arange(len(prices)) * (gw / (len(prices) - 1))
+        ys = gy + gh - (prices - p_min) / (p_max - p_min) * gh
 
-        f_axis = ImageFont.truetype(self.FONT_REG_PATH, 14)
-        f_title = ImageFont.truetype(self.FONT_BOLD_PATH, 22)
-        f_val   = ImageFont.truetype(self.FONT_BOLD_PATH, 22)
-        f_pct   = ImageFont.truetype(self.FONT_REG_PATH, 18)
+        f_axis, f_title, f_val, f_pct = self._fonts()
 
         # ==== Y軸 (単位付き) ====
         steps = 3
-        for i in range(steps):
-            ratio = i / (steps - 1)
-            val = p_min + (p_max - p_min) * ratio
-            y = map_y(val)
-            
+        ratios = np.linspace(0, 1, steps)
+        for r in ratios:
+            y = gy + gh - r * gh
             draw.line([(gx, y), (gx+gw, y)], fill=(220, 220, 220), width=1)
-            
-            # 軸ラベルにも単位をつける（スペース節約のためPrefixのみにするか、そのままつけるか）
-            # ここではシンプルにそのままつけます
-            axis_str = self.format_value(val, unit, pos)
+            axis_str = self.format_value(p_min + (p_max - p_min) * r, unit, pos)
             draw.text((gx + gw + 5, y - 8), axis_str, font=f_axis, fill=(150, 150, 150))
 
         # ==== X軸 (日付) ====
-        date_indices = [0, len(dates)-1]
-        for i in date_indices:
-            x = map_x(i)
+        for x, date, right in ((xs[0], dates[0], False), (xs[-1], dates[-1], True)):
             draw.line([(x, gy), (x, gy+gh)], fill=(220, 220, 220), width=1)
-            d_str = dates[i].strftime("%m/%d")
-            text_pos_x = x if i == 0 else x - 35
+            d_str = date.strftime(date_fmt)
+            text_pos_x = x - self._text_width(d_str, f_axis) if right else x
             draw.text((text_pos_x, gy + gh + 5), d_str, font=f_axis, fill=(100, 100, 100))
 
         # ==== グラフ線 ====
-        points = [(map_x(i), map_y(p)) for i, p in enumerate(prices)]
-        draw.line(points, fill=trend_color, width=2)
-        ex, ey = points[-1]
+        draw.line(np.column_stack((xs, ys)).ravel().tolist(), fill=trend_color, width=2)
+        ex, ey = xs[-1], ys[-1]
         draw.ellipse((ex-3, ey-3, ex+3, ey+3), fill=trend_color)
 
         # ==== タイトルと現在値 ====
-        draw.text((x_base + 10, y_base + 10), name, font=f_title, fill=(50, 50, 50))
+        draw.text((x_base + 10, y_base + 10), f"{name} ({label})", font=f_title, fill=(50, 50, 50))
         
         # 現在値 (単位あり)
         current_str = self.format_value(curr_price, unit, pos)
@@ -153,30 +303,34 @@ class StockUpdater(ImageUpdater):
         
         draw.text((x_base + 10, y_base + 40), current_str, font=f_val, fill=(20, 20, 20))
         # パーセント表示の位置調整（現在値の後ろに）
-        val_w = draw.textlength(current_str, font=f_val)
+        val_w = self._text_width(current_str, f_val)
         draw.text((x_base + 10 + val_w + 10, y_base + 42), pct_str, font=f_pct, fill=trend_color)
 
-    def create_screen(self, screen_config, data):
-        img = Image.new("RGB", (800, 480), color=(255, 255, 255))
+    def draw_quadrant(self, item, data, horizon=None):
+        """1 銘柄分のチャートを QUADRANT サイズの画像に描く"""
+        img = Image.new("RGB", QUADRANT, color=(255, 255, 255))
         draw = ImageDraw.Draw(img)
-        
-        positions = [
-            (0, 0, 400, 240),   (400, 0, 400, 240),
-            (0, 240, 400, 240), (400, 240, 400, 240)
-        ]
-        
-        for i, item in enumerate(screen_config):
-            if i >= 4: break
-            rect = positions[i]
-            ticker = item["ticker"]
-            
-            if ticker in data:
-                self.draw_detailed_chart(draw, rect, data[ticker], item)
-            else:
-                x,y,w,h = rect
-                draw.rectangle((x,y,x+w,y+h), outline=(200,200,200))
-                draw.text((x+20, y+100), "Data Error", fill=(0,0,0))
+        rect = (0, 0) + QUADRANT
+        ticker = item["ticker"]
+
+        if ticker in data:
+            self.draw_detailed_chart(draw, rect, data[ticker], item, horizon)
+        else:
+            x,y,w,h = rect
+            draw.rectangle((x,y,x+w,y+h), outline=(200,200,200))
+            draw.text((x+20, y+100), "Data Error", fill=(0,0,0))
+        return img
+
+    def create_screen(self, screen_config, data, horizon=None):
+        img = Image.new("RGB", (800, 480), color=(255, 255, 255))
 
+        # 4 つのチャートを並列に描いて、それぞれの位置に貼る
+        quadrants = self._pool.map(lambda item: self.draw_quadrant(item, data, horizon),
+                                   screen_config[:len(POSITIONS)])
+        for pos, quadrant in zip(POSITIONS, quadrants):
+            img.paste(quadrant, pos)
+
+        draw = ImageDraw.Draw(img)
         # 区切り線
         draw.line([(400, 0), (400, 480)], fill=(180, 180, 180), width=2)
         draw.line([(0, 240), (800, 240)], fill=(180, 180, 180), width=2)
@@ -185,8 +339,11 @@ class StockUpdater(ImageUpdater):
 
     def update(self):
         try:
-            df = self.fetch_data()
-            imgs = [self.create_screen(cfg, df) for cfg in self.SCREENS_CONFIG]
+            # 表示期間は更新ごとに 1D → 1M → 1Y → 5Y と切り替える
+            horizon = HORIZONS[self._horizon % len(HORIZONS)]
+            self._horizon += 1
+            data = self.fetch_data(horizon)
+            imgs = [self.create_screen(cfg, data, horizon) for cfg in self.SCREENS_CONFIG]
             self.image_request(imgs)
         except Exception as e:
             print(f"StockUpdater Error: {e}")
@@ -1,8 +1,24 @@
-from ImageUpdater import ImageUpdater
-import requests
+from ImageUpdater import ImageUpdater, MIN_REFRESH_INTERVAL, UPDATE_SLOT
 import os
+import json
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from PIL import Image, ImageDraw, ImageFont
+from DepartureIndex import DepartureIndex, service_minutes
+from OdptClient import OdptClient, UPDATE_DEADLINE, LIVE_DEADLINE
+from OdptCalendar import CalendarService
+
+# 駅・バス停時刻表のローカル保存先 (時刻表改正時以外は変わらないため日次で更新)
+TIMETABLE_CACHE_DIR = "./cache/odpt"
+
+# 先行して描画する発車案内フレーム: ディスプレイの最短更新間隔ごとに、この Updater の持ち時間の間だけ。
+# 次の Updater が画面を送ると未送信のフレームは取り消されるため、それより先は描かない。
+# 持ち時間の終わりから最短更新間隔以内のフレームは、表示しても次の Updater の送信が
+# 最短更新間隔待たされるだけなので描かない
+FRAME_INTERVAL = MIN_REFRESH_INTERVAL
+FRAME_HORIZON  = UPDATE_SLOT - MIN_REFRESH_INTERVAL
 
 
 class TrainUpdater(ImageUpdater):
@@ -16,6 +32,8 @@ class TrainUpdater(ImageUpdater):
         
         self.API_BASE = "https://api.odpt.org/api/v4"
         self.API_KEY = os.environ.get("ODPT_API_KEY", "YOUR_API_KEY_HERE")
+        self.odpt = OdptClient(self.API_BASE, self.API_KEY)
+        self._deadline = None   # 更新中の ODPT 待ち締め切り (time.monotonic() 基準)
         
         self.BUS_CONFIG = {
             "screen1": {
@@ -252,111 +270,152 @@ class TrainUpdater(ImageUpdater):
             "Tobu": "東武",
         }
 
-    def fetch_station_timetable(self, station_id, operator):
-        url = f"{self.API_BASE}/odpt:StationTimetable"
-        params = {
-            "odpt:station": station_id,
-            "acl:consumerKey": self.API_KEY
-        }
+        # 時刻表ストア (メモリ上) と、そこからコンパイルした発車時刻索引
+        self._timetables = {}
+        self.departures = DepartureIndex()
+        self._compiled = {}
+        self._index_lock = threading.Lock()
+        self.calendar = CalendarService()
+        self._calendar_checked = {}   # 事業者固有カレンダー id → 最後に取得した日
+
+    def _timetable_cache_path(self, kind, entity_id):
+        return os.path.join(TIMETABLE_CACHE_DIR, kind, entity_id.replace(":", "_") + ".json")
+
+    def _issued(self, timetables):
+        """時刻表群の改訂日時 (dct:issued / dc:date の最大値)"""
+        return max((t.get("dct:issued") or t.get("dc:date") or "" for t in timetables), default="")
+
+    def _parse_jst(self, value):
+        """ODPT の日時文字列 → JST の aware datetime (タイムゾーン省略は JST とみなす。読めなければ None)"""
         try:
-            resp = requests.get(url, params=params, timeout=15)
-            resp.raise_for_status()
-            return resp.json()
+            dt = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+        return dt.replace(tzinfo=self.JST) if dt.tzinfo is None else dt
+
+    def _is_fresh(self, cache, now):
+        """同じ日 (JST) に取得済みで、取得後に dct:valid の期限を迎えていなければ True。
+        期限を過ぎても同じ時刻表が配信され続けることがあるため、期限切れは取り直す合図として
+        1 回だけ扱い、以降は日次の確認に戻る。"""
+        fetched = self._parse_jst(cache["fetched_at"])
+        if fetched is None or fetched.date() != now.date():
+            return False
+        for cals in cache["calendars"].values():
+            for t in cals:
+                valid = self._parse_jst(t.get("dct:valid"))
+                if valid is not None and fetched < valid <= now:
+                    return False
+        return True
+
+    def _load_timetable(self, kind, entity_id, download):
+        """{"fetched_at", "issued", "calendars": {calendar: [timetable, ...]}} を返す (なければ None)。
+        ローカル保存分が当日取得済みならそれを使い、古ければ download() で取り直す。
+        取り直しに失敗したときは古い保存分を使う。"""
+        path = self._timetable_cache_path(kind, entity_id)
+        now = datetime.now(self.JST)
+        cache = self._timetables.get(path)
+        if cache is None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                # 書き込み途中で落ちた等で読めない保存分は、ないものとして取り直す
+                print(f"TrainUpdater: 時刻表キャッシュを読めません {path}: {e}")
+                cache = None
+        if cache and self._is_fresh(cache, now):
+            self._timetables[path] = cache
+            return cache
+
+        timetables = download()
+        if not timetables:
+            return cache
+
+        issued = self._issued(timetables)
+        if cache and issued and cache.get("issued") == issued:
+            # 改訂なし: 取得日時だけ更新
+            cache["fetched_at"] = now.isoformat()
+        else:
+            calendars = {}
+            for t in timetables:
+                calendars.setdefault(t.get("odpt:calendar", ""), []).append(t)
+            cache = {"fetched_at": now.isoformat(), "issued": issued, "calendars": calendars}
+            print(f"TrainUpdater: 時刻表を更新 {entity_id} ({issued or '改訂日不明'})")
+
+        self._save_timetable(path, cache)
+        self._timetables[path] = cache
+        return cache
+
+    @staticmethod
+    def _save_timetable(path, cache):
+        """一時ファイルに書いてから置き換える (途中で落ちても壊れた保存分を残さない)"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"TrainUpdater: 時刻表キャッシュを保存できません {path}: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _download_station_timetable(self, station_id):
+        try:
+            return self.odpt.get("odpt:StationTimetable", {"odpt:station": station_id})
         except Exception as e:
             print(f"Error fetching timetable for {station_id}: {e}")
             return []
 
+    def fetch_station_timetable(self, station_id, operator):
+        cache = self._load_timetable(
+            "StationTimetable", station_id,
+            lambda: self._download_station_timetable(station_id),
+        )
+        if not cache:
+            return []
+        return [t for cals in cache["calendars"].values() for t in cals]
+
     def fetch_train_information(self):
         operators = [
             "TokyoMetro", "Toei", "JR-East", "Yurikamome",
             "Keikyu", "Tokyu", "Odakyu", "Keio", "Seibu", "Tobu"
         ]
+        jobs = {
+            operator: (lambda operator=operator: self.odpt.get(
+                "odpt:TrainInformation", {"odpt:operator": f"odpt.Operator:{operator}"}))
+            for operator in operators
+        }
+        # 時刻表の更新とは別の締め切りで待つ (日次の更新に時間を取られても空にならないように)
+        results = self.odpt.run(jobs, time.monotonic() + LIVE_DEADLINE)
+
         all_info = []
-        
         for operator in operators:
-            url = f"{self.API_BASE}/odpt:TrainInformation"
-            params = {
-                "odpt:operator": f"odpt.Operator:{operator}",
-                "acl:consumerKey": self.API_KEY
-            }
-            try:
-                resp = requests.get(url, params=params, timeout=15)
-                resp.raise_for_status()
-                data = resp.json()
-                all_info.extend(data)
-            except Exception as e:
-                print(f"Error fetching train info for {operator}: {e}")
-        
+            all_info.extend(results.get(operator, []))
         return all_info
 
-    def fetch_bus_stop_timetable(self, stop_id):
-        url = f"{self.API_BASE}/odpt:BusstopPoleTimetable"
-        params = {
-            "odpt:busstopPole": stop_id,
-            "acl:consumerKey": self.API_KEY
-        }
+    def _download_bus_stop_timetable(self, stop_id):
         try:
-            resp = requests.get(url, params=params, timeout=15)
-            resp.raise_for_status()
-            return resp.json()
+            return self.odpt.get("odpt:BusstopPoleTimetable", {"odpt:busstopPole": stop_id})
         except Exception as e:
             print(f"Error fetching bus timetable for {stop_id}: {e}")
             return []
 
+    def fetch_bus_stop_timetable(self, stop_id):
+        cache = self._load_timetable(
+            "BusstopPoleTimetable", stop_id,
+            lambda: self._download_bus_stop_timetable(stop_id),
+        )
+        if not cache:
+            return []
+        return [t for cals in cache["calendars"].values() for t in cals]
+
     def get_upcoming_buses(self, timetable_data, num_buses=5):
-        now = datetime.now(self.JST)
-        current_time = now.strftime("%H:%M")
-        weekday = now.weekday()
-        
-        if weekday < 5:
-            calendar_type = "Weekday"
-        elif weekday == 5:
-            calendar_type = "Saturday"
-        else:
-            calendar_type = "Holiday"
-        
-        buses = []
-        seen_times = set()
-        
-        for timetable in timetable_data:
-            cal = timetable.get("odpt:calendar", "")
-            if calendar_type not in cal and "SaturdayHoliday" not in cal:
-                if calendar_type in ["Saturday", "Holiday"] and "SaturdayHoliday" in cal:
-                    pass
-                else:
-                    continue
-            
-            busroute = timetable.get("odpt:busroute", "")
-            if isinstance(busroute, list):
-                busroute = busroute[0] if busroute else ""
-            route_name = busroute.split(".")[-1] if busroute else ""
-            
-            destination = timetable.get("odpt:destinationBusstopPole", "")
-            if isinstance(destination, list):
-                destination = destination[0] if destination else ""
-            dest_name = destination.split(".")[-1] if destination else ""
-            
-            bus_objects = timetable.get("odpt:busstopPoleTimetableObject", [])
-            
-            for bus in bus_objects:
-                dep_time = bus.get("odpt:departureTime", "")
-                if not dep_time:
-                    continue
-                
-                if dep_time >= current_time:
-                    time_key = f"{dep_time}_{route_name}_{dest_name}"
-                    if time_key in seen_times:
-                        continue
-                    seen_times.add(time_key)
-                    
-                    buses.append({
-                        "time": dep_time,
-                        "route": route_name,
-                        "destination": dest_name,
-                    })
-        
-        buses.sort(key=lambda x: x["time"])
-        return buses[:num_buses]
+        index = DepartureIndex()
+        self._compile_buses(index, "", timetable_data)
+        return self._query_buses(index, "", num_buses)
 
     def translate_station_name(self, name):
         if not name:
@@ -383,74 +442,162 @@ class TrainUpdater(ImageUpdater):
         return self.RAILWAY_NAME_MAP.get(clean_railway, clean_railway)
 
     def get_upcoming_trains_by_direction(self, timetable_data, num_trains=3):
-        now = datetime.now(self.JST)
-        current_time = now.strftime("%H:%M")
-        weekday = now.weekday()
-        
-        if weekday < 5:
-            calendar_type = "Weekday"
-        elif weekday == 5:
-            calendar_type = "Saturday"
-        else:
-            calendar_type = "Holiday"
-        
-        directions = {}
-        
+        index = DepartureIndex()
+        self._compile_trains(index, "", timetable_data)
+        return self._query_trains(index, "", num_trains)
+
+    # ── 発車時刻索引 ─────────────────────────────────────────────────────────
+
+    def _compile_trains(self, index, stop, timetable_data):
         for timetable in timetable_data:
-            cal = timetable.get("odpt:calendar", "")
-            if calendar_type not in cal and "SaturdayHoliday" not in cal:
-                if calendar_type in ["Saturday", "Holiday"] and "SaturdayHoliday" in cal:
-                    pass
-                else:
-                    continue
-            
             direction_raw = timetable.get("odpt:railDirection", "")
             direction_key = direction_raw.split(":")[-1] if direction_raw else "Unknown"
-            direction_ja = self.translate_direction(direction_raw)
-            
-            if direction_key not in directions:
-                directions[direction_key] = {
-                    "direction_ja": direction_ja,
-                    "trains": [],
-                    "seen_times": set()
-                }
-            
-            train_objects = timetable.get("odpt:stationTimetableObject", [])
-            
-            for train in train_objects:
-                dep_time = train.get("odpt:departureTime", "")
-                if not dep_time:
-                    continue
-                
-                if dep_time >= current_time:
-                    if dep_time in directions[direction_key]["seen_times"]:
-                        continue
-                    directions[direction_key]["seen_times"].add(dep_time)
-                    
-                    train_type_raw = train.get("odpt:trainType", "")
-                    train_type_ja = self.translate_train_type(train_type_raw)
-                    
-                    dest_stations = train.get("odpt:destinationStation", [])
-                    if dest_stations and len(dest_stations) > 0:
-                        dest_raw = dest_stations[0]
-                    else:
-                        dest_raw = ""
-                    dest_ja = self.translate_station_name(dest_raw)
-                    
-                    directions[direction_key]["trains"].append({
-                        "time": dep_time,
-                        "destination": dest_ja,
-                        "train_type": train_type_ja,
-                    })
-        
-        for direction_key in directions:
-            directions[direction_key]["trains"].sort(key=lambda x: x["time"])
-            directions[direction_key]["trains"] = directions[direction_key]["trains"][:num_trains]
-            del directions[direction_key]["seen_times"]
-        
+
+            train_objects = [t for t in timetable.get("odpt:stationTimetableObject", [])
+                             if t.get("odpt:departureTime")]
+            minutes = service_minutes([t["odpt:departureTime"] for t in train_objects])
+            departures = []
+            for m, train in zip(minutes, train_objects):
+                dest_stations = train.get("odpt:destinationStation", [])
+                dest_raw = dest_stations[0] if dest_stations else ""
+                departures.append((
+                    m,
+                    self.translate_station_name(dest_raw),
+                    self.translate_train_type(train.get("odpt:trainType", "")),
+                ))
+            index.add(stop, direction_key, self.translate_direction(direction_raw),
+                      timetable.get("odpt:calendar", ""), departures, unique_minutes=True)
+
+    def _compile_buses(self, index, stop, timetable_data):
+        for timetable in timetable_data:
+            busroute = timetable.get("odpt:busroute", "")
+            if isinstance(busroute, list):
+                busroute = busroute[0] if busroute else ""
+            route_name = busroute.split(".")[-1] if busroute else ""
+
+            destination = timetable.get("odpt:destinationBusstopPole", "")
+            if isinstance(destination, list):
+                destination = destination[0] if destination else ""
+            dest_name = destination.split(".")[-1] if destination else ""
+
+            bus_objects = [b for b in timetable.get("odpt:busstopPoleTimetableObject", [])
+                           if b.get("odpt:departureTime")]
+            minutes = service_minutes([b["odpt:departureTime"] for b in bus_objects])
+            index.add(stop, "", "", timetable.get("odpt:calendar", ""),
+                      [(m, route_name, dest_name) for m in minutes])
+
+    def _calendars_for(self, index, stop, day):
+        """day に運行する stop のカレンダー id (stop が持つうち最も優先度の高いもの)"""
+        have = index.calendars.get(stop, ())
+        for cal in self.calendar.resolve(day.date()):
+            if cal in have:
+                return [cal]
+        return []
+
+    def _next(self, index, stop, direction, n, now=None):
+        now = now or datetime.now(self.JST)
+        return index.next_departures(
+            stop, direction,
+            self._calendars_for(index, stop, now),
+            now.hour * 60 + now.minute, n,
+            prev_calendars=self._calendars_for(index, stop, now - timedelta(days=1)),
+        )
+
+    def _query_trains(self, index, stop, num_trains, now=None):
+        now = now or datetime.now(self.JST)
+        calendars = set(self._calendars_for(index, stop, now))
+        calendars |= set(self._calendars_for(index, stop, now - timedelta(days=1)))
+        directions = {}
+        for direction_key, direction_ja in index.directions.get(stop, {}).items():
+            if not index.has_departures(stop, direction_key, calendars):
+                continue
+            directions[direction_key] = {
+                "direction_ja": direction_ja,
+                "trains": [
+                    {"time": t, "destination": dest, "train_type": train_type}
+                    for t, dest, train_type in self._next(index, stop, direction_key,
+                                                          num_trains, now)
+                ],
+            }
         return directions
 
-    def make_timetable_screen(self, config, screen_width=800, screen_height=480):
+    def _query_buses(self, index, stop, num_buses, now=None):
+        return [
+            {"time": t, "route": route, "destination": dest}
+            for t, route, dest in self._next(index, stop, "", num_buses, now)
+        ]
+
+    def _ensure_compiled(self, kind, entity_id, download, compile_fn):
+        """時刻表ストアが更新されていれば索引を作り直す"""
+        cache = self._load_timetable(kind, entity_id, download)
+        stamp = (cache["issued"] or cache["fetched_at"]) if cache else None
+        with self._index_lock:
+            if self._compiled.get(entity_id) != stamp:
+                self.departures.clear(entity_id)
+                if cache:
+                    compile_fn(self.departures, entity_id,
+                               [t for cals in cache["calendars"].values() for t in cals])
+                self._compiled[entity_id] = stamp
+
+    def _offline_during_update(self, download):
+        """更新中は refresh_timetables で取り切れなかった分を取り直さず、保存分で描画する"""
+        return (lambda: []) if self._deadline is not None else download
+
+    def refresh_timetables(self):
+        """表示対象の駅・バス停の時刻表を並行に更新し索引に反映する"""
+        jobs = {}
+        for config in self.STATION_CONFIG.values():
+            for station in config["stations"]:
+                sid = station["station_id"]
+                jobs[sid] = lambda sid=sid: self._ensure_compiled(
+                    "StationTimetable", sid,
+                    lambda: self._download_station_timetable(sid), self._compile_trains,
+                )
+        for config in self.BUS_CONFIG.values():
+            for stop in config["stops"]:
+                pid = stop["stop_id"]
+                jobs[pid] = lambda pid=pid: self._ensure_compiled(
+                    "BusstopPoleTimetable", pid,
+                    lambda: self._download_bus_stop_timetable(pid), self._compile_buses,
+                )
+        self.odpt.run(jobs, self._deadline)
+        self.refresh_calendars()
+
+    def refresh_calendars(self):
+        """時刻表に現れる事業者固有カレンダーの該当日を (1 日 1 回) 取得して登録する"""
+        today = datetime.now(self.JST).date()
+        with self._index_lock:
+            unknown = {c for cals in self.departures.calendars.values() for c in cals
+                       if c and not self.calendar.is_known(c)}
+        jobs = {
+            cal: (lambda cal=cal: self.odpt.get("odpt:Calendar", {"owl:sameAs": cal}))
+            for cal in unknown if self._calendar_checked.get(cal) != today
+        }
+        for cal, data in self.odpt.run(jobs, self._deadline).items():
+            self._calendar_checked[cal] = today
+            for entry in data:
+                self.calendar.add_specific(entry.get("owl:sameAs", cal), entry.get("odpt:day", []))
+
+    def upcoming_trains(self, station_id, num_trains=3, now=None):
+        self._ensure_compiled(
+            "StationTimetable", station_id,
+            self._offline_during_update(lambda: self._download_station_timetable(station_id)),
+            self._compile_trains,
+        )
+        # 締め切りに遅れた refresh_timetables のジョブが索引を作り直していることがあるので、ロックの中で引く
+        with self._index_lock:
+            return self._query_trains(self.departures, station_id, num_trains, now)
+
+    def upcoming_buses(self, stop_id, num_buses=5, now=None):
+        self._ensure_compiled(
+            "BusstopPoleTimetable", stop_id,
+            self._offline_during_update(lambda: self._download_bus_stop_timetable(stop_id)),
+            self._compile_buses,
+        )
+        with self._index_lock:
+            return self._query_buses(self.departures, stop_id, num_buses, now)
+
+    def make_timetable_screen(self, config, screen_width=800, screen_height=480, now=None):
         bg_color = (245, 245, 250)
         text_color = (30, 30, 30)
         sub_color = (100, 100, 100)
@@ -468,7 +615,7 @@ class TrainUpdater(ImageUpdater):
         except:
             f_title = f_station = f_direction = f_time = f_dest = f_type = ImageFont.load_default()
         
-        now = datetime.now(self.JST)
+        now = now or datetime.now(self.JST)
         draw.text((15, 10), config["title"], font=f_title, fill=text_color)
         draw.text((screen_width - 80, 12), now.strftime("%H:%M"), font=f_title, fill=text_color)
         
@@ -504,8 +651,7 @@ class TrainUpdater(ImageUpdater):
                 station_label = f"{station['name']} ({line_ja})"
             draw.text((x_offset + 12, y_offset + 2), station_label, font=f_station, fill=text_color)
             
-            timetable_data = self.fetch_station_timetable(station["station_id"], station["operator"])
-            directions = self.get_upcoming_trains_by_direction(timetable_data, num_trains=3)
+            directions = self.upcoming_trains(station["station_id"], num_trains=3, now=now)
             
             if directions:
                 dir_keys = list(directions.keys())
@@ -563,7 +709,7 @@ class TrainUpdater(ImageUpdater):
         
         return img
 
-    def make_bus_screen(self, config, screen_width=800, screen_height=480):
+    def make_bus_screen(self, config, screen_width=800, screen_height=480, now=None):
         bg_color = (245, 245, 250)
         text_color = (30, 30, 30)
         sub_color = (100, 100, 100)
@@ -580,7 +726,7 @@ class TrainUpdater(ImageUpdater):
         except:
             f_title = f_stop = f_time = f_route = f_dest = ImageFont.load_default()
         
-        now = datetime.now(self.JST)
+        now = now or datetime.now(self.JST)
         draw.text((15, 10), config["title"], font=f_title, fill=text_color)
         draw.text((screen_width - 80, 12), now.strftime("%H:%M"), font=f_title, fill=text_color)
         
@@ -611,8 +757,7 @@ class TrainUpdater(ImageUpdater):
             stop_label = f"{stop['name']} バス停"
             draw.text((x_offset + 12, y_offset + 2), stop_label, font=f_stop, fill=text_color)
             
-            timetable_data = self.fetch_bus_stop_timetable(stop["stop_id"])
-            buses = self.get_upcoming_buses(timetable_data, num_buses=8)
+            buses = self.upcoming_buses(stop["stop_id"], num_buses=8, now=now)
             
             if buses:
                 bus_y = y_offset + 28
@@ -764,15 +909,51 @@ class TrainUpdater(ImageUpdater):
         
         return img
 
+    def _departure_state(self, now):
+        """now 時点で表示される発車案内 (フレームの差分判定用)"""
+        buses = [self.upcoming_buses(stop["stop_id"], num_buses=8, now=now)
+                 for stop in self.BUS_CONFIG["screen1"]["stops"]]
+        trains = [self.upcoming_trains(station["station_id"], num_trains=3, now=now)
+                  for station in self.STATION_CONFIG["screen3"]["stations"]]
+        return repr(buses), repr(trains)
+
+    def _departure_tokens(self, state):
+        """発車案内の状態 → 各ディスプレイの画面の識別子 (運行情報画面は None)"""
+        return [("TrainUpdater.bus", state[0]), None, ("TrainUpdater.timetable", state[1])]
+
+    def make_departure_frames(self, start, horizon=FRAME_HORIZON, interval=FRAME_INTERVAL):
+        """start より後、horizon 秒先までの各更新枠に表示するフレームを索引から描画する。
+        [(表示時刻 (epoch 秒), images, tokens), ...] を返す。運行情報画面は据え置き (None)。
+        発車案内が同じ画面は 1 度だけ描いて使い回し、表示中の画面と同じかは送信時に tokens で判定する。"""
+        frames, rendered = [], {}
+        for k in range(1, horizon // interval + 1):
+            at = start + timedelta(seconds=k * interval)
+            tokens = self._departure_tokens(self._departure_state(at))
+            if tokens[0] not in rendered:
+                rendered[tokens[0]] = self.make_bus_screen(self.BUS_CONFIG["screen1"], now=at)
+            if tokens[2] not in rendered:
+                rendered[tokens[2]] = self.make_timetable_screen(self.STATION_CONFIG["screen3"], now=at)
+            frames.append((at.timestamp(), [rendered[tokens[0]], None, rendered[tokens[2]]], tokens))
+        return frames
+
     def update(self):
         try:
-            img_screen1 = self.make_bus_screen(self.BUS_CONFIG["screen1"])
+            self._deadline = time.monotonic() + UPDATE_DEADLINE
+            self.refresh_timetables()
+            now = datetime.now(self.JST)
+            img_screen1 = self.make_bus_screen(self.BUS_CONFIG["screen1"], now=now)
             img_screen2 = self.make_delay_screen()
-            img_screen3 = self.make_timetable_screen(self.STATION_CONFIG["screen3"])
-            
-            self.image_request([img_screen1, img_screen2, img_screen3])
+            img_screen3 = self.make_timetable_screen(self.STATION_CONFIG["screen3"], now=now)
+
+            self.image_request([img_screen1, img_screen2, img_screen3],
+                               self._departure_tokens(self._departure_state(now)))
+            # ディスプレイの最短更新間隔は書き換えが終わった時刻から数えるので、フレームは送信後を起点にする
+            frames = self.make_departure_frames(datetime.now(self.JST))
+            self.schedule_frames(frames)
         except Exception as e:
             print(f"TrainUpdater Error: {e}")
+        finally:
+            self._deadline = None
 
 
 if __name__ == "__main__":
@@ -1,16 +1,48 @@
 from WebsiteUpdater import WebsiteUpdater
+from AmeshRenderer import AmeshRenderer
 import requests
+import hashlib
+import json
 import os
+import re
+import time
 from datetime import datetime, timedelta, timezone
 from PIL import Image, ImageDraw, ImageFont
 
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY_VARS = [
+    "temperature_2m", "relative_humidity_2m", "apparent_temperature", "precipitation_probability",
+    "weathercode", "wind_speed_10m", "pressure_msl", "uv_index", "winddirection_10m",
+]
+DAILY_VARS = [
+    "weathercode", "temperature_2m_max", "temperature_2m_min", "precipitation_probability_max",
+    "sunrise", "sunset", "uv_index_max",
+]
+
+# 予報のキャッシュ: Open-Meteo のモデル出力は 1 時間ごとに更新されるので、
+# Cache-Control の指定がなければ次の正時 + MODEL_UPDATE_MARGIN 秒まで有効とする
+WEATHER_CACHE_DIR = "./cache/weather"
+MODEL_UPDATE_MARGIN = 5 * 60
+
+# (表示名, 緯度, 経度)。複数指定すると 1 回のリクエストでまとめて取得し、更新ごとに順に表示する
+DEFAULT_LOCATIONS = [("東京", 35.6812, 139.7671)]
+
+
 class WeatherUpdater(WebsiteUpdater):
 
-    def __init__(self):
+    def __init__(self, api_url=FORECAST_URL, locations=None):
         self.JST = timezone(timedelta(hours=9))
-        self.LOCATION = "東京"
-        self.LAT = 35.6812
-        self.LON = 139.7671
+        self.api_url = api_url
+        self.session = requests.Session()
+        self._forecasts = {}   # キャッシュキー → {"expires_at", "etag", "last_modified", "payload"}
+        os.makedirs(WEATHER_CACHE_DIR, exist_ok=True)
+        self.locations = locations or DEFAULT_LOCATIONS
+        self.LOCATION, self.LAT, self.LON = self.locations[0]
+        self._cursor = 0   # 次に表示する地点
+
+        # 地点間で共有する描画リソース
+        self._fonts = {}   # (path, size) → FreeTypeFont
+        self._icons = {}   # (code, is_day, size) → (説明, リサイズ済みアイコン)
         
         # フォント設定
         self.FONT_REG_PATH = "./fonts/NotoSansJP-Regular.ttf"
@@ -50,8 +82,9 @@ class WeatherUpdater(WebsiteUpdater):
             99: ("雷雨", "thunder"),
         }
 
-        urls = ["http://project92.com/amesh/"]
-        super().__init__(urls)
+        # 雨雲レーダーはブラウザを使わず画像を直接合成する
+        self.amesh = AmeshRenderer(self.FONT_BOLD_PATH)
+        super().__init__([self.amesh.source])
 
     def get_weather_icon(self, code, is_day):
         """
@@ -95,26 +128,95 @@ class WeatherUpdater(WebsiteUpdater):
         
         # 文字でファイル名を描いておく（何を作ればいいかわかるように）
         try:
-            f = ImageFont.truetype(self.FONT_REG_PATH, 14)
+            f = self._font(self.FONT_REG_PATH, 14)
             draw.text((30, 70), filename, font=f, fill=(255,255,255))
         except:
             pass
 
         return desc, img
 
+    def _font(self, path, size):
+        key = (path, size)
+        if key not in self._fonts:
+            self._fonts[key] = ImageFont.truetype(path, size)
+        return self._fonts[key]
+
+    def _icon(self, code, is_day, size):
+        key = (code, bool(is_day), size)
+        if key not in self._icons:
+            desc, icon_img = self.get_weather_icon(code, is_day)
+            self._icons[key] = (desc, icon_img.resize((size, size), Image.Resampling.LANCZOS))
+        return self._icons[key]
+
     def fetch_weather(self):
-        BASE_URL = (
-            "https://api.open-meteo.com/v1/forecast?"
-            f"latitude={self.LAT}&longitude={self.LON}&timezone=Asia%2FTokyo"
-            "&current_weather=true"
-            "&hourly=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation_probability,weathercode,wind_speed_10m,pressure_msl,uv_index,winddirection_10m"
-            "&daily=weathercode,temperature_2m_max,temperature_2m_min,precipitation_probability_max,sunrise,sunset,uv_index_max"
-        )
-        resp = requests.get(BASE_URL, timeout=15)
-        resp.raise_for_status()
-        return resp.json()
+        """先頭の地点の予報"""
+        return self.fetch_forecasts()[0]
+
+    def fetch_forecasts(self):
+        """全地点の予報を 1 回のリクエストでまとめて取得し、self.locations の順に返す"""
+        params = {
+            "latitude": ",".join(str(lat) for _, lat, _ in self.locations),
+            "longitude": ",".join(str(lon) for _, _, lon in self.locations),
+            "timezone": "Asia/Tokyo",
+            "current_weather": "true",
+            "hourly": ",".join(HOURLY_VARS),
+            "daily": ",".join(DAILY_VARS),
+        }
+        payload = self._cached_forecast(params)
+        # 1 地点なら object、複数地点なら地点ごとの配列で返ってくる
+        return payload if isinstance(payload, list) else [payload]
+
+    def _expiry(self, resp, now):
+        m = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+        if m:
+            return now + int(m.group(1))
+        return (now // 3600 + 1) * 3600 + MODEL_UPDATE_MARGIN
+
+    def _cached_forecast(self, params):
+        """地点と変数ごとに予報をキャッシュする。期限内ならネットワークに出ず、
+        期限切れなら ETag / Last-Modified 付きの条件付きリクエストで取り直す。"""
+        key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        path = os.path.join(WEATHER_CACHE_DIR, f"{key}.json")
+        now = time.time()
+
+        entry = self._forecasts.get(key)
+        if entry is None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        if entry and now < entry["expires_at"]:
+            self._forecasts[key] = entry
+            return entry["payload"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            resp = self.session.get(self.api_url, params=params, headers=headers, timeout=15)
+            if resp.status_code == 304 and entry:
+                payload = entry["payload"]
+            else:
+                resp.raise_for_status()
+                payload = resp.json()
+        except Exception as e:
+            if entry:
+                print(f"WeatherUpdater: 予報の取得に失敗、前回分を使用 ({e})")
+                return entry["payload"]
+            raise
+
+        entry = {
+            "expires_at": self._expiry(resp, now),
+            "etag": resp.headers.get("ETag") or (entry or {}).get("etag"),
+            "last_modified": resp.headers.get("Last-Modified") or (entry or {}).get("last_modified"),
+            "payload": payload,
+        }
+        self._forecasts[key] = entry
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        return payload
     
-    def make_today(self, payload):
+    def make_today(self, payload, location=None):
         now = datetime.now(self.JST)
         current = payload["current_weather"]
         hourly = payload["hourly"]
@@ -125,7 +227,8 @@ class WeatherUpdater(WebsiteUpdater):
         is_day = current["is_day"]
         
         # アイコン取得
-        desc, icon_img = self.get_weather_icon(current["weathercode"], is_day)
+        icon_sz = 160
+        desc, icon_img = self._icon(current["weathercode"], is_day, icon_sz)
         
         temp = current["temperature"]
         wind_spd = current["windspeed"]
@@ -149,21 +252,19 @@ class WeatherUpdater(WebsiteUpdater):
 
         # フォント読み込み
         try:
-            f_title = ImageFont.truetype(self.FONT_BOLD_PATH, 36)
-            f_temp  = ImageFont.truetype(self.FONT_BOLD_PATH, 90)
-            f_med   = ImageFont.truetype(self.FONT_REG_PATH, 26)
-            f_sml   = ImageFont.truetype(self.FONT_REG_PATH, 22)
-            f_mini  = ImageFont.truetype(self.FONT_REG_PATH, 16)
+            f_title = self._font(self.FONT_BOLD_PATH, 36)
+            f_temp  = self._font(self.FONT_BOLD_PATH, 90)
+            f_med   = self._font(self.FONT_REG_PATH, 26)
+            f_sml   = self._font(self.FONT_REG_PATH, 22)
+            f_mini  = self._font(self.FONT_REG_PATH, 16)
         except:
             f_title = f_temp = f_med = f_sml = f_mini = ImageFont.load_default()
 
         # 描画
-        draw.text((40, 25), f"{self.LOCATION} の天気", font=f_title, fill=text_color)
+        draw.text((40, 25), f"{location or self.LOCATION} の天気", font=f_title, fill=text_color)
         draw.text((40, 70), now.strftime("%Y-%m-%d (%a) %H:%M"), font=f_sml, fill=sub_color)
 
         # アイコン貼り付け
-        icon_sz = 160
-        icon_img = icon_img.resize((icon_sz, icon_sz), Image.Resampling.LANCZOS)
         img.paste(icon_img, (50, 110), icon_img)
 
         draw.text((230, 130), f"{int(temp)}°C", font=f_temp, fill=text_color)
@@ -208,7 +309,7 @@ class WeatherUpdater(WebsiteUpdater):
 
         return img
     
-    def make_week(self, payload):
+    def make_week(self, payload, location=None):
         daily = payload["daily"]
         days = daily["time"]
         weathercodes = daily["weathercode"]
@@ -222,17 +323,17 @@ class WeatherUpdater(WebsiteUpdater):
         draw = ImageDraw.Draw(img)
 
         try:
-            f_title = ImageFont.truetype(self.FONT_BOLD_PATH, 36)
-            f_day   = ImageFont.truetype(self.FONT_BOLD_PATH, 24)
-            f_data  = ImageFont.truetype(self.FONT_REG_PATH, 22)
-            f_sml   = ImageFont.truetype(self.FONT_REG_PATH, 18)
+            f_title = self._font(self.FONT_BOLD_PATH, 36)
+            f_day   = self._font(self.FONT_BOLD_PATH, 24)
+            f_data  = self._font(self.FONT_REG_PATH, 22)
+            f_sml   = self._font(self.FONT_REG_PATH, 18)
         except:
             f_title = f_day = f_data = f_sml = ImageFont.load_default()
 
         text_color = (30,30,30) if is_day else (240,240,240)
         sub_color  = (80,80,80) if is_day else (180,180,180)
 
-        draw.text((40, 25), f"{self.LOCATION} の週間天気", font=f_title, fill=text_color)
+        draw.text((40, 25), f"{location or self.LOCATION} の週間天気", font=f_title, fill=text_color)
 
         jp_days = ["月", "火", "水", "木", "金", "土", "日"]
         start_x, start_y, usable_w = 25, 90, 750
@@ -248,8 +349,7 @@ class WeatherUpdater(WebsiteUpdater):
             draw.text((x_center - 10, y + 20), jp_days[date.weekday()], font=f_day, fill=text_color)
 
             # アイコン (週間は常に昼で取得)
-            _, icon_img = self.get_weather_icon(weathercodes[i], is_day=1)
-            icon_img = icon_img.resize((60, 60), Image.Resampling.LANCZOS)
+            _, icon_img = self._icon(weathercodes[i], 1, 60)
             img.paste(icon_img, (int(x_center - 30), int(y + 55)), icon_img)
 
             temp_text = f"{int(tmaxs[i])}/{int(tmins[i])}"
@@ -274,17 +374,18 @@ class WeatherUpdater(WebsiteUpdater):
                 last = (x, y)
         return img
 
-    def parse_amesh(self, img):
-        return img.crop((0, 60, 760, 460)).resize((800,480))
-
     def update(self):
         try:
-            imgs = self.screen_shot(self.website_urls)
-            img_amesh = self.parse_amesh(imgs[0])
-            data = self.fetch_weather()
-            img_today = self.make_today(data)
-            img_week = self.make_week(data)
-            self.image_request([img_amesh, img_week, img_today])
+            img_amesh = self.amesh.render()
+            (img_amesh,), (amesh_token,) = self._gate([img_amesh], self.website_urls, self.urls[:1])
+            forecasts = self.fetch_forecasts()
+            # 地点が複数あれば更新ごとに順に表示する (予報の取得は全地点まとめて 1 回)
+            i = self._cursor % len(self.locations)
+            self._cursor = i + 1
+            name = self.locations[i][0]
+            img_today = self.make_today(forecasts[i], name)
+            img_week = self.make_week(forecasts[i], name)
+            self.image_request([img_amesh, img_week, img_today], [amesh_token, None, None])
         except Exception as e:
             print(f"WeatherUpdate Error: {e}")
 
@@ -1,102 +1,124 @@
 import io
-import os
-import glob
-import re
 import time
 from PIL import Image
-import requests
-
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+
 from ImageUpdater import ImageUpdater
+from BrowserWorker import PANEL, fit_viewport, get_worker, download_latest_ublock_firefox_xpi
+from PageReadiness import POLL_INTERVAL, Readiness
+
+HASH_SIZE = 16        # dHash の一辺 (HASH_SIZE² ビット)
+HASH_THRESHOLD = 10   # 前回送信分とのハミング距離がこれ以下なら送らない
+
+
+def dhash(image, size=HASH_SIZE):
+    """縮小したグレースケール画像の横方向の明暗差から作る知覚ハッシュ"""
+    gray = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    px = gray.tobytes()
+    bits = 0
+    for y in range(size):
+        row = px[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
 
 class WebsiteUpdater(ImageUpdater):
 
-    def __init__(self, urls):
+    def __init__(self, urls, parallel_tabs=True, ready_selectors=None,
+                 hash_threshold=HASH_THRESHOLD):
         self.website_urls = urls
+        # True なら全 URL を別タブで同時に読み込み、準備できたタブから撮影する
+        self.parallel_tabs = parallel_tabs
+        # 撮影可否の判定。ready_selectors: {ホスト名: 表示を待つ要素の CSS セレクタ}
+        self.readiness = Readiness(ready_selectors)
+        # 見た目がほぼ同じ撮影結果を送らないためのしきい値 (None なら常に送る)
+        self.hash_threshold = hash_threshold
         super().__init__()
 
 
     def download_latest_ublock_firefox_xpi(self):
-        dest_dir = "./ublock"
-        os.makedirs(dest_dir, exist_ok=True)
-
-        for file in os.listdir(dest_dir):
-            if file.endswith(".firefox.signed.xpi"):
-                return os.path.join(dest_dir, file)
-
-        api = "https://api.github.com/repos/gorhill/uBlock/releases/latest"
-        r = requests.get(api, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-
-        # uBlockのFirefox用xpi資産を探す（例: uBlock0_1.58.0.firefox.xpi）
-        asset = None
-        for a in data.get("assets", []):
-            name = a.get("name", "")
-            if name.endswith(".firefox.xpi") or name.endswith(".firefox.signed.xpi"):
-                asset = a
-                break
-        else:
-            raise RuntimeError("Firefox向けXPIが見つかりませんでした。")
-
-        url = asset["browser_download_url"]
-        xpi_path = os.path.join(dest_dir, asset["name"])
-        with requests.get(url, timeout=60, stream=True) as rr:
-            rr.raise_for_status()
-            with open(xpi_path, "wb") as f:
-                for chunk in rr.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        return xpi_path
+        return download_latest_ublock_firefox_xpi()
+
+    def _to_panel(self, png_bytes):
+        """スクリーンショット → パネルサイズの RGB 画像。
+        通常はブラウザがパネル解像度で描画しているので変換のみ。"""
+        img = Image.open(io.BytesIO(png_bytes)).convert("RGB")
+        if img.size != PANEL:
+            img = img.resize(PANEL, Image.LANCZOS)
+        return img
+
+    def _navigate(self, driver, url):
+        # driver.get は load イベントまでブロックするので、スクリプトで遷移だけ始める。
+        # 遷移前のページには印を付け、準備完了と誤判定しないようにする
+        driver.execute_script(
+            "window.__epaperStale = true; window.location.href = arguments[0];", url)
+
+    def _capture(self, driver, urls):
+        outputs = []
+        fit_viewport(driver)
+        for url in urls:
+            self._navigate(driver, url)
+            if not self.readiness.wait(driver, url):
+                print(f"WebsiteUpdater: {url} timed out, capturing as is")
+            png_bytes = driver.get_screenshot_as_png()
+            outputs.append(self._to_panel(png_bytes))
+        return outputs
+
+    def _capture_parallel(self, driver, urls):
+        """urls を別々のタブで同時に読み込み、各タブが準備でき次第撮影する"""
+        fit_viewport(driver)
+        tabs = {}   # handle → (index, 締め切り)
+        for i, url in enumerate(urls):
+            if i > 0:
+                driver.switch_to.new_window("tab")
+            self._navigate(driver, url)
+            tabs[driver.current_window_handle] = (i, time.monotonic() + self.readiness.timeout)
+
+        outputs = [None] * len(urls)
+        while tabs:
+            for handle, (i, deadline) in list(tabs.items()):
+                driver.switch_to.window(handle)
+                if not self.readiness.probe(driver, urls[i]):
+                    if time.monotonic() < deadline:
+                        continue
+                    print(f"WebsiteUpdater: {urls[i]} timed out, capturing as is")
+                    driver.execute_script("window.stop();")
+                png_bytes = driver.get_screenshot_as_png()
+                outputs[i] = self._to_panel(png_bytes)
+                del tabs[handle]
+            if tabs:
+                time.sleep(POLL_INTERVAL)
+        return outputs
 
     def screen_shot(self, urls):
-        xpi_path = self.download_latest_ublock_firefox_xpi()
-
-        options = Options()
-        options.add_argument("-headless")
-
-        # 画面サイズ
-        options.set_preference("layout.css.devPixelsPerPx", "1.0")
-
-        driver = webdriver.Firefox(
-            service = Service(),
-            options=options
-        )
-        try:
-
-            # uBlockを一時インストール
-            driver.install_addon(xpi_path, temporary=True)
-
-            outputs = []
-            for url in urls:
-                # アドオン初回タブなどが開くことがあるので、対象URLで上書き
-                driver.get(url)
-                driver.set_window_size(int(800*1.5), int(480*1.5))
-
-                # DOMの安定待ち
-                WebDriverWait(driver, 30).until(
-                    lambda d: d.execute_script("return document.readyState") == "complete"
-                )
-                # uBlockのフィルタが効くまで、わずかに待機（広告DOMやネットワークの抑制が浸透）
-                time.sleep(1.0)
-                png_bytes = driver.get_screenshot_as_png()
-                outputs.append(Image.open(io.BytesIO(png_bytes)))
-            return outputs
-            
-        finally:
-            xpi_files = glob.glob(os.path.join("/tmp", '*.xpi'))
-            for file in xpi_files:
-                os.remove(file)
-            driver.quit()
+        """常駐ブラウザ (BrowserWorker) で urls を撮影する"""
+        capture = self._capture_parallel if self.parallel_tabs and len(urls) > 1 else self._capture
+        return get_worker().run(lambda driver: capture(driver, urls))
     
+    def _gate(self, images, src_urls, displays):
+        """displays[i] に前回送った src_urls[i] の撮影結果と見た目がほぼ同じなら images[i] を None にする。
+        (images, tokens) を返す。"""
+        out, tokens = [], []
+        for img, src, display in zip(images, src_urls, displays):
+            if img is None:
+                out.append(None)
+                tokens.append(None)
+                continue
+            token = ("screenshot", src, dhash(img))
+            shown = self.displayed_token(display)
+            if (self.hash_threshold is not None and isinstance(shown, tuple) and len(shown) == 3
+                    and shown[:2] == token[:2]
+                    and bin(shown[2] ^ token[2]).count("1") <= self.hash_threshold):
+                print(f"{type(self).__name__}: {src} は前回とほぼ同じため送信しません")
+                img = None
+            out.append(img)
+            tokens.append(token)
+        return out, tokens
+
     def update(self):
         imgs = self.screen_shot(self.website_urls)
-        self.image_request(imgs)
+        imgs, tokens = self._gate(imgs, self.website_urls, self.urls)
+        self.image_request(imgs, tokens)
 
 if __name__ == "__main__":
     updater = WebsiteUpdater([
@@ -0,0 +1,52 @@
+"""
+Prometheus 系 Updater のベンチマーク (collect + render)。
+PrometheusStub の synthetic モードを同一プロセスで起動し、ディスプレイへの送信は行わない。
+
+使い方:
+  python bench_prometheus.py                       # 10 / 100 / 1000 系列
+  python bench_prometheus.py --sizes 10 100 --latency 0.02 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+
+from PrometheusStub import SyntheticSeries, start_stub
+from NodeUpdater import NodeUpdater
+from KafkaUpdater import KafkaUpdater
+from ElasticSearchUpdater import ElasticSearchUpdater
+
+
+UPDATERS = [NodeUpdater, KafkaUpdater, ElasticSearchUpdater]
+
+
+def bench(updater_cls, prom_url: str, repeat: int) -> list[float]:
+    updater = updater_cls(prom_url)
+    updater.image_request = lambda images, tokens=None: None  # 送信は計測対象外
+    updater.page_ttl = 0  # 毎回ページキャッシュを使わずに collect する
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        updater.update()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="collect+render benchmark against PrometheusStub")
+    ap.add_argument("--sizes",   type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--latency", type=float, default=0.0, help="スタブ応答ごとの遅延 (秒)")
+    ap.add_argument("--repeat",  type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'updater':<22}{'size':>6}{'median[s]':>12}{'min[s]':>10}")
+    for size in args.sizes:
+        source = SyntheticSeries(nodes=size, topics=size, indices=size)
+        server, url = start_stub(source, latency=args.latency)
+        try:
+            for cls in UPDATERS:
+                times = bench(cls, url, args.repeat)
+                print(f"{cls.__name__:<22}{size:>6}"
+                      f"{statistics.median(times):>12.3f}{min(times):>10.3f}")
+        finally:
+            server.shutdown()
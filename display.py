@@ -28,6 +28,9 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(mes
 
 def trim_to_800x480(image: Image.Image) -> Image.Image:
     width, height = image.size
+    if (width, height) == (TARGET_WIDTH, TARGET_HEIGHT):
+        # 送信側でパネルサイズにしてあるものはリサンプルしない
+        return image.convert("RGB")
     target_ratio = TARGET_WIDTH / TARGET_HEIGHT
     current_ratio = width / height
 
@@ -7,6 +7,7 @@ from ExhibitionUpdater import ExhibitionUpdater
 from NodeUpdater import NodeUpdater
 from KafkaUpdater import KafkaUpdater
 from ElasticSearchUpdater import ElasticSearchUpdater
+from ImageUpdater import UPDATE_SLOT
 import time
 
 
@@ -23,14 +24,21 @@ stockUpdater = StockUpdater()
 trainUpdater = TrainUpdater()
 exhibitionUpdater = ExhibitionUpdater()
 nodeUpdater = NodeUpdater()
-kafkaUpdater = KafkaUpdater()
-esUpdater = ElasticSearchUpdater()
+kafkaUpdater = KafkaUpdater(rotate=True)
+esUpdater = ElasticSearchUpdater(rotate=True)
+
+updaters = [trainUpdater, newsUpdater, illustUpdater, weatherUpdater, stockUpdater, exhibitionUpdater, nodeUpdater, kafkaUpdater, esUpdater]
+
+# 各 Updater が動くのは一巡 (全 Updater × UPDATE_SLOT) に 1 回。
+# Prometheus 系のページキャッシュは次の巡回まで (更新にかかる時間の余裕として 1 枠足す) 使い回す
+for updater in (kafkaUpdater, esUpdater):
+    updater.page_ttl = (len(updaters) + 1) * UPDATE_SLOT
 
 while True:
-    for updater in [trainUpdater, newsUpdater, illustUpdater, weatherUpdater, stockUpdater, exhibitionUpdater, nodeUpdater, kafkaUpdater, esUpdater]:
+    for updater in updaters:
         try:
             updater.update()
-            time.sleep(15*60)
+            time.sleep(UPDATE_SLOT)
         except:
             continue
 